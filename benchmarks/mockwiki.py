@@ -0,0 +1,388 @@
+# Local stand-in for the MediaWiki Action API, for benchmarking without touching a real wiki.
+# Implements what mediawiki_pybot uses: login and tokens, userinfo, siteinfo extensions, list=categorymembers
+# and list=search (also as generators, with CirrusSearch's insource: keyword), prop=revisions, prop=info and
+# prop=redirects for batches of titles (with normalization and redirects) and action=edit.
+# Latency, edit rate limits and errors can be injected.
+#
+# Run standalone:
+#   python3 benchmarks/mockwiki.py --port 8080 --pages 1000 --latency 0.05
+# and save http://127.0.0.1:8080/api.php as url with 'mediawiki_pybot save'. Any username and password are accepted.
+
+# standard library imports
+import argparse
+import json
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORY_PATTERN = re.compile(r"\[\[\s*Category\s*:\s*([^\]|]+?)\s*(?:\|[^\]]*)?\]\]", re.IGNORECASE)
+REDIRECT_PATTERN = re.compile(r"^\s*#REDIRECT\s*\[\[([^\]|]+)", re.IGNORECASE)
+NAMESPACES = {"Category": 14, "File": 6, "Template": 10, "User": 2}
+SESSION_COOKIE = "mockwiki_session"
+# insource:/regex/, insource:"phrase" or a plain search term
+SEARCH_TERM_PATTERN = re.compile(r'insource:/((?:\\.|[^/\\])*)/(i?)|insource:"([^"]*)"|(\S+)')
+
+def normalize_title(title: str) -> str:
+    title = re.sub(r"[_\s]+", " ", title).strip()
+    if ":" in title:
+        prefix, rest = title.split(":", 1)
+        if prefix.strip().capitalize() in NAMESPACES:
+            rest = rest.strip()
+            return prefix.strip().capitalize() + ":" + rest[:1].upper() + rest[1:]
+    return title[:1].upper() + title[1:]
+
+def get_namespace(title: str) -> int:
+    prefix = title.split(":", 1)[0] if ":" in title else ""
+    return NAMESPACES.get(prefix, 0)
+
+class MockWiki:
+    # Wiki state shared by all request threads, guarded by a single lock.
+
+    def __init__(self, latency: float = 0, jitter: float = 0, edit_rate: float = None, error_rate: float = 0,
+    server_error_rate: float = 0, retry_after: float = 1, high_limits: bool = False, search_max_hits: int = 10000,
+    seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        # max edits per second before edits are answered with 'ratelimited'
+        self.edit_rate = edit_rate
+        # fraction of requests answered with a maxlag error, or with HTTP 500
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after = retry_after
+        self.high_limits = high_limits
+        # like CirrusSearch, results past this offset aren't listed
+        self.search_max_hits = search_max_hits
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.categories = {}
+        self.sessions = {}
+        self.revid = 0
+        self.clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.edit_times = []
+        self.counters = {'requests': 0, 'edits': 0, 'errors': 0}
+
+    def timestamp(self) -> str:
+        # every write moves the clock forward, so revision timestamps are always increasing
+        self.clock += timedelta(seconds=1)
+        return self.clock.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def set_page(self, title: str, text: str) -> dict:
+        title = normalize_title(title)
+        old_page = self.pages.get(title)
+        if old_page is not None:
+            for category in old_page['categories']:
+                self.categories.get(category, set()).discard(title)
+        self.revid += 1
+        categories = {"Category:" + normalize_title(name) for name in CATEGORY_PATTERN.findall(text)}
+        page = {
+            'pageid': old_page['pageid'] if old_page is not None else len(self.pages) + 1,
+            'title': title,
+            'ns': get_namespace(title),
+            'text': text,
+            'revid': self.revid,
+            'timestamp': self.timestamp(),
+            'categories': categories
+        }
+        self.pages[title] = page
+        for category in categories:
+            self.categories.setdefault(category, set()).add(title)
+        return page
+
+    def populate(self, page_count: int, category: str = "Benchmark", redirect_count: int = 0):
+        # pages that contain text matched by substitution_example.txt, all in the same category
+        with self.lock:
+            for i in range(page_count):
+                self.set_page(f"Page {i}", f"Hello Cateogry {i}\n1999 Releases\n[[Category:{category}]]")
+            for i in range(redirect_count):
+                self.set_page(f"Redirect {i}", f"#REDIRECT [[Page {i % max(page_count, 1)}]]\n[[Category:{category}]]")
+
+    def redirect_target(self, title: str) -> str:
+        page = self.pages.get(title)
+        match = REDIRECT_PATTERN.match(page['text']) if page is not None else None
+        return normalize_title(match.group(1)) if match else None
+
+    # -- request handling --
+
+    def handle(self, params: dict, session: str) -> tuple[int, dict, dict]:
+        # returns (status, headers, body)
+        with self.lock:
+            self.counters['requests'] += 1
+            if self.server_error_rate and self.random.random() < self.server_error_rate:
+                self.counters['errors'] += 1
+                return 500, {}, None
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.counters['errors'] += 1
+                return 200, {'Retry-After': str(self.retry_after)}, \
+                    {'error': {'code': "maxlag", 'info': "Waiting for a database server: 6 seconds lagged.", 'lag': 6}}
+
+            action = params.get('action')
+            if action == "query":
+                return 200, {}, self.query(params, session)
+            elif action == "login":
+                return 200, {}, self.login(params, session)
+            elif action == "edit":
+                return 200, {}, self.edit(params, session)
+            return 200, {}, {'error': {'code': "badvalue", 'info': f"Unrecognized value for parameter \"action\": {action}."}}
+
+    def login(self, params: dict, session: str) -> dict:
+        if params.get('lgtoken') != self.sessions.get(session, {}).get('logintoken'):
+            return {'login': {'result': "Failed", 'reason': "Unable to continue login. Your session most likely timed out."}}
+        self.sessions[session]['user'] = params.get('lgname')
+        self.sessions[session]['csrftoken'] = secrets.token_hex(16) + "+\\"
+        return {'login': {'result': "Success", 'lgusername': params.get('lgname')}}
+
+    def query(self, params: dict, session: str) -> dict:
+        data = {'batchcomplete': True, 'query': {}}
+        if params.get('curtimestamp'):
+            data['curtimestamp'] = self.clock.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        if params.get('meta') == "tokens":
+            state = self.sessions.setdefault(session, {})
+            if params.get('type') == "login":
+                state['logintoken'] = secrets.token_hex(16) + "+\\"
+                data['query']['tokens'] = {'logintoken': state['logintoken']}
+            else:
+                data['query']['tokens'] = {'csrftoken': state.get('csrftoken', "+\\")}
+        elif params.get('meta') == "userinfo":
+            user = self.sessions.get(session, {}).get('user')
+            rights = ["read", "edit", "createpage"] + (["apihighlimits"] if self.high_limits else [])
+            data['query']['userinfo'] = {'id': 1 if user else 0, 'name': user or "127.0.0.1", 'rights': rights}
+        elif params.get('meta') == "siteinfo" and "extensions" in params.get('siprop', "").split("|"):
+            data['query']['extensions'] = [{'type': "other", 'name': "CirrusSearch"}]
+
+        titles = None
+        if params.get('list') == "categorymembers":
+            members, continue_params = self.category_members(params, "cm")
+            data['query']['categorymembers'] = [{'ns': self.pages[title]['ns'], 'title': title} for title in members]
+            if continue_params:
+                data['continue'] = {**continue_params, 'continue': "-||"}
+        elif params.get('generator') == "categorymembers":
+            titles, continue_params = self.category_members(params, "gcm")
+            if continue_params:
+                data['continue'] = {**continue_params, 'continue': "gcmcontinue||"}
+        elif params.get('list') == "search":
+            results, total_hits, continue_params = self.search(params, "sr")
+            data['query']['search'] = [{'ns': self.pages[title]['ns'], 'title': title} for title in results]
+            if "totalhits" in params.get('srinfo', "totalhits").split("|"):
+                data['query']['searchinfo'] = {'totalhits': total_hits}
+            if continue_params:
+                data['continue'] = {**continue_params, 'continue': "-||"}
+        elif params.get('generator') == "search":
+            titles, _, continue_params = self.search(params, "gsr")
+            if continue_params:
+                data['continue'] = {**continue_params, 'continue': "gsroffset||"}
+        elif 'titles' in params:
+            titles = params['titles'].split("|")
+            limit = 500 if self.high_limits else 50
+            if len(titles) > limit:
+                data['warnings'] = {'query': {'warnings': f"Too many values supplied for parameter \"titles\". The limit is {limit}."}}
+                titles = titles[:limit]
+
+        if titles is not None:
+            data['query'].update(self.page_props(titles, params))
+        return data
+
+    def category_members(self, params: dict, prefix: str) -> tuple[list[str], dict]:
+        category = normalize_title(params.get(prefix + 'title', ""))
+        members = sorted(self.categories.get(category, ()))
+        if params.get(prefix + 'namespace', "*") != "*":
+            namespaces = {int(ns) for ns in params[prefix + 'namespace'].split("|")}
+            members = [title for title in members if self.pages[title]['ns'] in namespaces]
+        limit = params.get(prefix + 'limit', "10")
+        limit = (500 if self.high_limits else 50) if limit == "max" else int(limit)
+        offset = int(params.get(prefix + 'continue', 0))
+        continue_params = {prefix + 'continue': str(offset + limit)} if offset + limit < len(members) else None
+        return members[offset:offset + limit], continue_params
+
+    def search(self, params: dict, prefix: str) -> tuple[list[str], int, dict]:
+        # every term must match: insource: terms against the page source, plain terms against source or title
+        matchers = []
+        for (regex, flags, phrase, word) in SEARCH_TERM_PATTERN.findall(params.get(prefix + 'search', "")):
+            if phrase or word:
+                term = (phrase or word).lower()
+                matchers.append(lambda page, term=term, source_only=bool(phrase):
+                    term in page['text'].lower() or (not source_only and term in page['title'].lower()))
+            else:
+                try:
+                    pattern = re.compile(regex, re.IGNORECASE if flags else 0)
+                except re.error:
+                    matchers.append(lambda page: False)
+                    continue
+                matchers.append(lambda page, pattern=pattern: pattern.search(page['text']) is not None)
+        namespace = params.get(prefix + 'namespace', "0")
+        namespaces = None if namespace == "*" else {int(ns) for ns in namespace.split("|")}
+        # redirects are never search results
+        results = [title for (title, page) in sorted(self.pages.items())
+            if (namespaces is None or page['ns'] in namespaces) and self.redirect_target(title) is None
+            and matchers and all(matcher(page) for matcher in matchers)]
+        limit = params.get(prefix + 'limit', "10")
+        limit = (500 if self.high_limits else 50) if limit == "max" else int(limit)
+        offset = int(params.get(prefix + 'offset', 0))
+        end = min(offset + limit, len(results), self.search_max_hits)
+        continue_params = {prefix + 'offset': str(end)} if end < min(len(results), self.search_max_hits) else None
+        return results[offset:end], len(results), continue_params
+
+    def page_props(self, titles: list[str], params: dict) -> dict:
+        props = params.get('prop', "").split("|")
+        query = {}
+        normalized = []
+        redirects = []
+        pages = {}
+        redirect_sources = {}
+        if "redirects" in props:
+            for source in self.pages:
+                if self.redirect_target(source) is not None:
+                    redirect_sources.setdefault(self.redirect_target(source), []).append(source)
+        for title in titles:
+            normalized_title = normalize_title(title)
+            if normalized_title != title:
+                normalized.append({'from': title, 'to': normalized_title})
+            title = normalized_title
+            if params.get('redirects') and self.redirect_target(title) is not None:
+                redirects.append({'from': title, 'to': self.redirect_target(title)})
+                title = self.redirect_target(title)
+            page = self.pages.get(title)
+            if page is None:
+                pages[title] = {'ns': get_namespace(title), 'title': title, 'missing': True}
+                continue
+            result = {'pageid': page['pageid'], 'ns': page['ns'], 'title': title}
+            if "info" in props:
+                result.update({'contentmodel': "wikitext", 'lastrevid': page['revid'], 'length': len(page['text'])})
+            if "revisions" in props:
+                result['revisions'] = [{
+                    'revid': page['revid'],
+                    'timestamp': page['timestamp'],
+                    'slots': {'main': {'contentmodel': "wikitext", 'contentformat': "text/x-wiki", 'content': page['text']}}
+                }]
+            if "redirects" in props:
+                result['redirects'] = [{'ns': self.pages[source]['ns'], 'title': source} for source in redirect_sources.get(title, [])]
+            pages[title] = result
+        query['pages'] = list(pages.values())
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+        return query
+
+    def edit(self, params: dict, session: str) -> dict:
+        state = self.sessions.get(session, {})
+        if params.get('assert') == "user" and state.get('user') is None:
+            return {'error': {'code': "assertuserfailed", 'info': "You are no longer logged in, so the action could not be completed."}}
+        if params.get('token') != state.get('csrftoken', "+\\"):
+            return {'error': {'code': "badtoken", 'info': "Invalid CSRF token."}}
+
+        if self.edit_rate is not None:
+            now = time.monotonic()
+            self.edit_times = [edit_time for edit_time in self.edit_times if now - edit_time < 1]
+            if len(self.edit_times) >= self.edit_rate:
+                self.counters['errors'] += 1
+                return {'error': {'code': "ratelimited", 'info': "As an anti-abuse measure, you are limited from performing this action too many times in a short space of time."}}
+            self.edit_times.append(now)
+
+        title = normalize_title(params.get('title', ""))
+        page = self.pages.get(title)
+        if params.get('createonly') and page is not None:
+            return {'error': {'code': "articleexists", 'info': "The article you tried to create has been created already."}}
+        if params.get('nocreate') and page is None:
+            return {'error': {'code': "missingtitle", 'info': "The page you specified doesn't exist."}}
+        if page is not None and params.get('basetimestamp') and params['basetimestamp'] < page['timestamp']:
+            return {'error': {'code': "editconflict", 'info': "Edit conflict."}}
+
+        if 'text' in params:
+            text = params['text']
+        else:
+            old_text = page['text'] if page is not None else ""
+            text = params.get('prependtext', "") + old_text + params.get('appendtext', "")
+
+        self.counters['edits'] += 1
+        if page is not None and page['text'] == text:
+            return {'edit': {'result': "Success", 'pageid': page['pageid'], 'title': title, 'contentmodel': "wikitext", 'nochange': True}}
+        old_revid = page['revid'] if page is not None else 0
+        page = self.set_page(title, text)
+        result = {'result': "Success", 'pageid': page['pageid'], 'title': title, 'contentmodel': "wikitext",
+            'oldrevid': old_revid, 'newrevid': page['revid'], 'newtimestamp': page['timestamp']}
+        if old_revid == 0:
+            result['new'] = True
+        return {'edit': result}
+
+class RequestHandler(BaseHTTPRequestHandler):
+    wiki: MockWiki = None
+    # keep-alive connections, with responses sent right away instead of waiting for delayed ACKs
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond(dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query, keep_blank_values=True)))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self.respond(dict(urllib.parse.parse_qsl(body, keep_blank_values=True)))
+
+    def respond(self, params: dict):
+        wiki = self.wiki
+        if wiki.latency or wiki.jitter:
+            time.sleep(wiki.latency + wiki.random.uniform(0, wiki.jitter))
+
+        session = None
+        for cookie in self.headers.get('Cookie', "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == SESSION_COOKIE:
+                session = value
+        headers = {}
+        if session is None:
+            session = secrets.token_hex(8)
+            headers['Set-Cookie'] = f"{SESSION_COOKIE}={session}; Path=/; HttpOnly"
+
+        status, response_headers, data = wiki.handle(params, session)
+        headers.update(response_headers)
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json; charset=utf-8")
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_server(wiki: MockWiki, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    # serves the wiki in a background thread, returning the server and its API url
+    handler = type("MockWikiHandler", (RequestHandler,), {'wiki': wiki})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api.php"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the MediaWiki Action API.")
+    parser.add_argument('--port', action='store', default=8080, type=int, help="port to listen on (default: 8080)")
+    parser.add_argument('--pages', action='store', default=1000, type=int,
+        help="number of pages created in Category:Benchmark (default: 1000)")
+    parser.add_argument('--redirects', action='store', default=0, type=int, help="number of redirects to those pages")
+    parser.add_argument('--latency', action='store', default=0, type=float, help="seconds added to every response")
+    parser.add_argument('--jitter', action='store', default=0, type=float, help="random extra latency, up to this many seconds")
+    parser.add_argument('--edit-rate', action='store', type=float, help="max edits per second before edits are rate limited")
+    parser.add_argument('--error-rate', action='store', default=0, type=float,
+        help="fraction of requests answered with a maxlag error")
+    parser.add_argument('--server-error-rate', action='store', default=0, type=float,
+        help="fraction of requests answered with HTTP 500")
+    parser.add_argument('--high-limits', action='store_true', help="give every user the apihighlimits right")
+    args = parser.parse_args()
+
+    wiki = MockWiki(latency=args.latency, jitter=args.jitter, edit_rate=args.edit_rate, error_rate=args.error_rate,
+        server_error_rate=args.server_error_rate, high_limits=args.high_limits)
+    wiki.populate(args.pages, redirect_count=args.redirects)
+    server, url = start_server(wiki, args.port)
+    print(f"Mock wiki with {args.pages} pages listening at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,151 @@
+# Measures throughput of pagelist generation, editing and page creation against the local mock wiki.
+# Reports pages per second and API requests per page for each operation.
+#
+#   python3 benchmarks/run_benchmarks.py --pages 2000 --latency 0.02
+#   python3 benchmarks/run_benchmarks.py --pages 500 --latency 0.05 --error-rate 0.02 --prefetch 100 --json results.json
+#   python3 benchmarks/run_benchmarks.py --pages 5000 --only edit edit-prefilter
+
+# standard library imports
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# custom modules
+from benchmarks.mockwiki import MockWiki, start_server
+from lib import libmediawiki
+
+CATEGORY = "Benchmark"
+# marks the pages looked for by the edit-prefilter benchmark
+TARGET = "{{Benchmark target}}"
+
+def run_benchmark(name: str, wiki: MockWiki, page_count: int, function, verbose: bool = False) -> dict:
+    requests_before = wiki.counters['requests']
+    start = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        function()
+    elapsed = time.perf_counter() - start
+    request_count = wiki.counters['requests'] - requests_before
+    return {
+        'benchmark': name,
+        'pages': page_count,
+        'seconds': round(elapsed, 3),
+        'pages_per_second': round(page_count / elapsed, 2) if elapsed > 0 else 0,
+        'requests': request_count,
+        'requests_per_page': round(request_count / page_count, 3) if page_count else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks mediawiki_pybot operations against a local mock wiki.")
+    parser.add_argument('--pages', action='store', default=1000, type=int, help="number of pages in the mock wiki (default: 1000)")
+    parser.add_argument('--redirects', action='store', default=0, type=int, help="number of redirects to those pages")
+    parser.add_argument('--latency', action='store', default=0.01, type=float,
+        help="seconds added by the mock wiki to every response (default: 0.01)")
+    parser.add_argument('--jitter', action='store', default=0, type=float, help="random extra latency, up to this many seconds")
+    parser.add_argument('--edit-rate', action='store', type=float, help="max edits per second accepted by the mock wiki")
+    parser.add_argument('--error-rate', action='store', default=0, type=float,
+        help="fraction of requests answered with a maxlag error")
+    parser.add_argument('--server-error-rate', action='store', default=0, type=float,
+        help="fraction of requests answered with HTTP 500")
+    parser.add_argument('--retry-after', action='store', default=0.1, type=float,
+        help="Retry-After sent with injected maxlag errors, in seconds (default: 0.1)")
+    parser.add_argument('--high-limits', action='store_true', help="give the bot the apihighlimits right")
+    parser.add_argument('--target-every', action='store', default=100, type=int,
+        help="one in this many pages is looked for by the edit-prefilter benchmark (default: 100)")
+    parser.add_argument('--prefetch', action='store', type=int, help="--prefetch option used for edit benchmarks")
+    parser.add_argument('--max-rate', action='store', type=float, help="--max-rate option used for edit and create benchmarks")
+    parser.add_argument('--workers', action='store', default=1, type=int, help="--workers option used for the create benchmark")
+    parser.add_argument('--only', action='store', nargs='+', help="only run the given benchmarks")
+    parser.add_argument('--json', action='store', help="also save results to a JSON file")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the output of each operation")
+    args = parser.parse_args()
+
+    wiki = MockWiki(latency=args.latency, jitter=args.jitter, edit_rate=args.edit_rate, error_rate=args.error_rate,
+        server_error_rate=args.server_error_rate, retry_after=args.retry_after, high_limits=args.high_limits, seed=0)
+    wiki.populate(args.pages, category=CATEGORY, redirect_count=args.redirects)
+    with wiki.lock:
+        for i in range(0, args.pages, args.target_every):
+            wiki.set_page(f"Page {i}", wiki.pages[f"Page {i}"]['text'] + "\n" + TARGET)
+    server, url = start_server(wiki)
+    # retries of injected server errors shouldn't dominate the results
+    libmediawiki.BACKOFF_BASE = 0.05
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        csrf_token = libmediawiki.login(username="Benchmark", password="benchmark", url=url)
+    libmediawiki.AUTH['csrf_token'] = csrf_token
+    page_count = args.pages + args.redirects
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pagelist_path = os.path.join(temp_dir, "pagelist.txt")
+        substitution_path = os.path.join(temp_dir, "substitutions.txt")
+        with open(substitution_path, "w") as substitution_file:
+            substitution_file.write('"Cateogry" "Category"\n"(\\d{4}) Releases" "\\1 Albums"\n')
+
+        def pagelist():
+            libmediawiki.save_pagelist(url=url, pagelist_path=pagelist_path, pagelist_mode="w",
+                pagelist_source="category", pagelist_target=CATEGORY)
+
+        def edit():
+            libmediawiki.edit_pages(csrf_token=csrf_token, url=url, pagelist_path=pagelist_path,
+                substitution_path=substitution_path, prefetch=args.prefetch, max_rate=args.max_rate)
+
+        def edit_source():
+            # appending, so every page is changed again after the substitutions of the previous benchmark
+            libmediawiki.edit_pages(csrf_token=csrf_token, url=url, pagelist_path=pagelist_path,
+                append="<!-- benchmark -->", prefetch=args.prefetch, max_rate=args.max_rate,
+                pagelist_source="category", pagelist_target=CATEGORY)
+
+        def edit_prefilter():
+            # only pages with the target are downloaded
+            libmediawiki.edit_pages(csrf_token=csrf_token, url=url, pagelist_path=pagelist_path,
+                append="<!-- prefilter -->", skip_ifnot=re.escape(TARGET), prefetch=args.prefetch,
+                max_rate=args.max_rate, search_prefilter=True)
+
+        def create():
+            with open(pagelist_path, "w") as pagelist_file:
+                for i in range(page_count):
+                    pagelist_file.write(f"New page {i}\n")
+                # pages that already exist
+                for i in range(0, args.pages, 2):
+                    pagelist_file.write(f"Page {i}\n")
+            libmediawiki.create_pages(csrf_token=csrf_token, url=url, pagelist_path=pagelist_path,
+                content="Created by benchmark", max_rate=args.max_rate, workers=args.workers)
+
+        benchmarks = [
+            ("pagelist", page_count, pagelist),
+            ("edit", page_count, edit),
+            ("edit-source", page_count, edit_source),
+            ("edit-prefilter", page_count, edit_prefilter),
+            ("create", page_count + (args.pages + 1) // 2, create)
+        ]
+        results = []
+        for (name, count, function) in benchmarks:
+            if args.only is not None and name not in args.only:
+                continue
+            # the edit benchmark empties the pagelist, so edit-prefilter always needs a new one
+            if (name == "edit" and args.only is not None and "pagelist" not in args.only) or name == "edit-prefilter":
+                with contextlib.redirect_stdout(io.StringIO()):
+                    pagelist()
+            results.append(run_benchmark(name, wiki, count, function, args.verbose))
+
+    server.shutdown()
+
+    print(f"Mock wiki: {args.pages} pages, {args.latency}s latency, error rate {args.error_rate}, " +
+        f"edit rate {args.edit_rate if args.edit_rate is not None else 'unlimited'}")
+    print(f"{'benchmark':<14}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'requests':>10}{'req/page':>10}")
+    for result in results:
+        print(f"{result['benchmark']:<14}{result['pages']:>8}{result['seconds']:>10.2f}{result['pages_per_second']:>10.1f}" +
+            f"{result['requests']:>10}{result['requests_per_page']:>10.3f}")
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump({'options': vars(args), 'results': results}, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
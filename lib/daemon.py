@@ -0,0 +1,203 @@
+# standard library imports
+import contextlib
+import io
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+
+# only standard library modules are imported here, so sending a job to a running daemon is fast.
+# operations that can be sent to the daemon
+JOB_OPERATIONS = ("pagelist", "edit", "create")
+
+def is_fanout(argv: list[str]) -> bool:
+    # runs on several wikis, one process each. those processes can't be stopped through the daemon,
+    # so these commands always run on their own
+    return any(arg == "--profiles" or arg.startswith("--profiles=") for arg in argv)
+
+def is_job(argv: list[str]) -> bool:
+    return len(argv) > 1 and argv[0] in JOB_OPERATIONS and "-h" not in argv and "--help" not in argv and not is_fanout(argv)
+
+def send_job(socket_path: str, argv: list[str]) -> bool:
+    # sends a job to the daemon and prints its output as it runs.
+    # returns False if no daemon is listening, so the job can be run locally instead
+    if not os.path.exists(socket_path):
+        return False
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return False
+    with client:
+        request = {'argv': argv, 'cwd': os.getcwd()}
+        client.sendall((json.dumps(request) + "\n").encode())
+        try:
+            while True:
+                output = client.recv(65536)
+                if not output:
+                    break
+                sys.stdout.buffer.write(output)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            # closing the connection stops the job the same way Ctrl+C stops a local run
+            print("\nExecution interrupted by user input.")
+    return True
+
+class JobStream(io.TextIOBase):
+    # Output of a job, sent to its client as it's written.
+    # Once the client disconnects, or the daemon is stopped, the next write from the job's own thread raises
+    # KeyboardInterrupt, so it stops the same way a local run does on Ctrl+C, saving its progress.
+    # Other threads of the job (e.g. the one prefetching pages) are never interrupted, their output is
+    # only discarded once the client is gone.
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.connected = True
+        self.interrupted = False
+        # thread running the job, set when it starts
+        self.job_thread = None
+
+    def writable(self) -> bool:
+        return True
+
+    def interrupt(self):
+        self.interrupted = True
+
+    def write(self, text: str) -> int:
+        in_job_thread = threading.get_ident() == self.job_thread
+        if self.interrupted and in_job_thread:
+            # raised once, the job keeps writing while it saves its progress
+            self.interrupted = False
+            raise KeyboardInterrupt
+        if self.connected:
+            try:
+                self.connection.sendall(text.encode())
+            except OSError:
+                self.connected = False
+                self.interrupted = True
+        if self.interrupted and in_job_thread:
+            self.interrupted = False
+            raise KeyboardInterrupt
+        return len(text)
+
+    def close(self):
+        self.connected = False
+        with contextlib.suppress(OSError):
+            self.connection.close()
+        super().close()
+
+class JobServer:
+    # Accepts jobs on a Unix socket and runs them one at a time, in the order they were received.
+    # Jobs share the daemon's login session and HTTP connections, and run with the working directory
+    # of the client that sent them, so relative paths work as they would in a local run.
+
+    def __init__(self, socket_path: str, run_job):
+        self.socket_path = os.path.abspath(socket_path)
+        self.run_job = run_job
+        self.jobs = queue.Queue()
+        self.job_count = 0
+        self.lock = threading.Lock()
+        self.running = None
+        self.stopping = False
+        # jobs' output is redirected while they run, the daemon's own messages always go to its terminal
+        self.log = sys.stdout
+
+    def listen(self) -> socket.socket:
+        if os.path.exists(self.socket_path):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client.connect(self.socket_path)
+                client.close()
+                raise Exception(f"A daemon is already listening on {self.socket_path}.")
+            except ConnectionRefusedError:
+                # left behind by a daemon that didn't exit cleanly
+                os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # jobs run with the saved credentials, so only the current user can send them
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        server.listen()
+        return server
+
+    def receive_job(self, connection: socket.socket):
+        try:
+            with connection.makefile("r", encoding="utf-8") as request_file:
+                request = json.loads(request_file.readline())
+            argv = [str(arg) for arg in request['argv']]
+            cwd = str(request['cwd'])
+        except (OSError, ValueError, KeyError, TypeError):
+            connection.close()
+            return
+        with self.lock:
+            self.job_count += 1
+            job_id = self.job_count
+        stream = JobStream(connection)
+        # jobs waiting in the queue, and the one running
+        waiting = self.jobs.unfinished_tasks
+        with contextlib.suppress(KeyboardInterrupt):
+            if waiting > 0:
+                stream.write(f"Job {job_id} queued, waiting for {waiting} jobs to finish...\n")
+        print(f"Job {job_id} received: {' '.join(argv)}", file=self.log)
+        self.jobs.put((job_id, argv, cwd, stream))
+
+    def run_jobs(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            (job_id, argv, cwd, stream) = job
+            if self.stopping:
+                with contextlib.suppress(KeyboardInterrupt):
+                    stream.write("Daemon stopped before the job started.\n")
+                stream.close()
+                self.jobs.task_done()
+                continue
+            print(f"Job {job_id} started.", file=self.log)
+            stream.job_thread = threading.get_ident()
+            self.running = stream
+            status = "finished"
+            try:
+                with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+                    os.chdir(cwd)
+                    self.run_job(argv)
+            except SystemExit:
+                # invalid arguments, reported to the client by argparse
+                status = "failed"
+            except KeyboardInterrupt:
+                status = "interrupted"
+            except Exception as e:
+                status = f"failed: {e}"
+            finally:
+                self.running = None
+                stream.close()
+                self.jobs.task_done()
+            print(f"Job {job_id} {status}.", file=self.log)
+
+    def serve_forever(self):
+        server = self.listen()
+        worker = threading.Thread(target=self.run_jobs, daemon=True)
+        worker.start()
+        print(f"Listening for jobs on {self.socket_path}. Press Ctrl+C to stop.")
+        try:
+            while True:
+                connection, _ = server.accept()
+                threading.Thread(target=self.receive_job, args=(connection,), daemon=True).start()
+        except KeyboardInterrupt:
+            server.close()
+            with contextlib.suppress(OSError):
+                os.remove(self.socket_path)
+            # the running job is interrupted so it saves its progress, queued jobs are not started
+            self.stopping = True
+            if self.running is not None:
+                print("Stopping the running job...", file=self.log)
+                self.running.interrupt()
+            self.jobs.put(None)
+            worker.join()
+            print("Daemon stopped.", file=self.log)
@@ -0,0 +1,78 @@
+# standard library imports
+import collections
+import csv
+import json
+import os
+import string
+
+DATA_FORMATS = ("csv", "tsv", "jsonl")
+
+def get_data_format(data_path: str, data_format: str = None) -> str:
+    if data_format is None:
+        extension = os.path.splitext(data_path)[1].lower().lstrip(".")
+        data_format = "jsonl" if extension in ("json", "ndjson") else extension
+    if data_format not in DATA_FORMATS:
+        raise Exception(f"Unable to read {data_path}: unsupported data format. Allowed formats: {', '.join(DATA_FORMATS)}.")
+    return data_format
+
+def read_rows(data_path: str, data_format: str = None):
+    # yields each row of a CSV/TSV file (first line as header) or of a JSON Lines file as a dict,
+    # reading one line at a time so memory use doesn't depend on the size of the file
+    if not os.path.exists(data_path):
+        raise Exception(f"Data file not found: {data_path}")
+    data_format = get_data_format(data_path, data_format)
+    with open(data_path, newline="", encoding="utf-8-sig") as data_file:
+        if data_format == "jsonl":
+            for (line_number, line) in enumerate(data_file, start=1):
+                if line.strip() == "":
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    raise Exception(f"Invalid JSON in {data_path}, line {line_number}: {e}")
+                if not isinstance(row, dict):
+                    raise Exception(f"Invalid row in {data_path}, line {line_number}: rows must be JSON objects.")
+                yield row
+        else:
+            yield from csv.DictReader(data_file, delimiter="\t" if data_format == "tsv" else ",")
+
+def read_pages(data_path: str, title_column: str = "title", data_format: str = None):
+    # yields (pagename, fields) for each row with a title
+    for row in read_rows(data_path, data_format):
+        if title_column not in row:
+            raise Exception(f"Column '{title_column}' not found in {data_path}. Set the title column with --title-column.")
+        # rows without a title (empty, null or missing from a short CSV row) are left out
+        pagename = str(row[title_column]).strip() if row[title_column] is not None else ""
+        if pagename != "":
+            yield pagename, row
+
+class TemplateFields(dict):
+    # Fields of a row as they're written in a content template.
+    # Empty values (JSON null, or columns missing from a CSV row shorter than the header) count as missing fields.
+    # Numbers and booleans are written as in JSON (e.g. 200, 1.5, true), lists and objects can't be used.
+
+    def __getitem__(self, name: str) -> str:
+        value = super().__getitem__(name)
+        if value is None:
+            raise KeyError(name)
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (str, int, float)):
+            return str(value)
+        raise Exception(f"Field '{name}' used in the content template is a list or object, only text, numbers and booleans can be used.")
+
+def check_template(template: string.Template):
+    # raises an error for invalid placeholders, before any row is read
+    try:
+        template.substitute(collections.defaultdict(str))
+    except ValueError as e:
+        raise Exception(f"Invalid content template: {e}")
+
+def render_content(template: string.Template, fields: dict) -> str:
+    # $field and ${field} are replaced with values from the row, $$ is a literal $
+    try:
+        return template.substitute(TemplateFields(fields))
+    except KeyError as e:
+        raise Exception(f"Field {e} used in the content template is missing.")
+    except ValueError as e:
+        raise Exception(f"Invalid content template: {e}")
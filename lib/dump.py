@@ -0,0 +1,102 @@
+# standard library imports
+import bz2
+import gzip
+import re
+import xml.etree.ElementTree as ElementTree
+# custom modules
+import lib.libmediawiki as libmediawiki
+import lib.utils as utils
+from lib.pagelists import PagelistIndex
+from lib.substitution import SubstitutionList, read_substitutions
+from lib.transform import PageTransform
+
+# number of titles kept in memory before being written to the pagelist
+WRITE_BATCH_SIZE = 1000
+
+def open_dump(dump_path: str):
+    # detecting compression by the file signature, so renamed files still work
+    with open(dump_path, "rb") as dump_file:
+        signature = dump_file.read(3)
+    if signature == b"BZh":
+        return bz2.open(dump_path, "rb")
+    elif signature[:2] == b"\x1f\x8b":
+        return gzip.open(dump_path, "rb")
+    else:
+        return open(dump_path, "rb")
+
+def read_dump(dump_path: str):
+    # https://www.mediawiki.org/wiki/Help:Export#Export_format
+    # yields (title, namespace, is_redirect, text) with the text of the latest revision of each page.
+    # parsed pages are cleared from the tree as soon as they are read, keeping memory usage bounded
+    with open_dump(dump_path) as dump_file:
+        context = ElementTree.iterparse(dump_file, events=("start", "end"))
+        _, root = next(context)
+        title, namespace, is_redirect, text = None, None, False, None
+        for event, element in context:
+            if event != "end":
+                continue
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = element.text
+            elif tag == "ns":
+                namespace = int(element.text)
+            elif tag == "redirect":
+                is_redirect = True
+            elif tag == "text":
+                # text of deleted revisions is not included in dumps
+                text = None if element.get("deleted") is not None else (element.text or "")
+            elif tag == "revision":
+                element.clear()
+            elif tag == "page":
+                yield title, namespace, is_redirect, text
+                title, namespace, is_redirect, text = None, None, False, None
+                root.clear()
+
+def scan_dump(dump_path: str, pagelist_path: str, pagelist_mode: str, substitution_path: str = None, append: str = None,
+prepend: str = None, skip_if: str = None, skip_ifnot: str = None, namespace: str = None, limit: int = None) -> int:
+    # writes to the pagelist the titles of pages that edit_pages would change, without using the API.
+    # redirects are left out, since their targets are in the dump as well
+    if substitution_path is None and append is None and prepend is None:
+        raise Exception("No modifications to be performed.")
+
+    substitution_list = SubstitutionList(read_substitutions(substitution_path))
+    skip_if = re.compile(skip_if) if skip_if is not None else None
+    skip_ifnot = re.compile(skip_ifnot) if skip_ifnot is not None else None
+    # the same transform edit_pages applies to each page
+    page_transform = PageTransform(substitution_list, skip_if, skip_ifnot, append, prepend)
+    namespace = libmediawiki.format_namespace(namespace)
+    NAMESPACES = [int(ns) for ns in namespace.split('|') if ns.strip().isdigit()] if namespace != "*" else []
+
+    utils.write_pagelist([], pagelist_path, pagelist_mode)
+    # titles already in the pagelist are not added again
+    index = PagelistIndex(pagelist_path if pagelist_mode == "a" else None)
+    pagelist = []
+    page_count = 0
+    changed_count = 0
+
+    print("Scanning dump...")
+    try:
+        for (title, page_namespace, is_redirect, text) in read_dump(dump_path):
+            page_count += 1
+            if page_count % 10000 == 0:
+                print(f"Scanned: {page_count}  Changed: {changed_count}")
+
+            if is_redirect or text is None or (NAMESPACES and page_namespace not in NAMESPACES):
+                continue
+            (text_edited, _, _) = page_transform.run(text)
+            if text_edited is not None and text_edited != text:
+                pagelist.append(title)
+                changed_count += 1
+                if len(pagelist) >= WRITE_BATCH_SIZE:
+                    utils.write_pagelist(index.add(pagelist), pagelist_path, "a")
+                    pagelist = []
+                if limit is not None and changed_count >= limit:
+                    break
+    except KeyboardInterrupt:
+        print("Execution interrupted by user input.")
+    finally:
+        utils.write_pagelist(index.add(pagelist), pagelist_path, "a")
+        index.close()
+
+    print(f"Scanned: {page_count}  Changed: {changed_count}")
+    return changed_count
@@ -0,0 +1,151 @@
+# standard library imports
+import argparse
+import copy
+import io
+import multiprocessing
+import multiprocessing.connection
+import os
+import re
+import sys
+# custom modules
+import lib.libmediawiki as libmediawiki
+import lib.utils as utils
+
+PROFILE_PATTERN = re.compile(r"^[\w.-]+$")
+
+def get_profile_paths(profiles_path: str, profile: str) -> dict:
+    # every profile keeps its own credentials, session, pagelist and page cache
+    if not PROFILE_PATTERN.match(profile) or profile in (".", ".."):
+        raise Exception(f"Invalid profile name: {profile}. Profile names can only have letters, numbers, '.', '-' and '_'.")
+    profile_path = os.path.join(profiles_path, profile)
+    return {
+        'credentials': os.path.join(profile_path, "credentials.json"),
+        'pagelist': os.path.join(profile_path, "pagelist.txt"),
+        'revisions': os.path.join(profile_path, "revisions.sqlite"),
+        'queue': os.path.join(profile_path, "queue.sqlite")
+    }
+
+def list_profiles(profiles_path: str) -> list[str]:
+    if not os.path.isdir(profiles_path):
+        return []
+    return sorted(profile for profile in os.listdir(profiles_path)
+        if os.path.exists(os.path.join(profiles_path, profile, "credentials.json")))
+
+def add_profile_name(path: str, profile: str) -> str:
+    # paths given for all wikis get the profile name before the extension, e.g. pagelist.txt -> pagelist.enwiki.txt
+    if path is None:
+        return None
+    root, extension = os.path.splitext(path)
+    return f"{root}.{profile}{extension}"
+
+class PrefixedOutput(io.TextIOBase):
+    # Output of one wiki, written to the shared terminal a whole line at a time, with the profile name in front.
+
+    def __init__(self, prefix: str, output):
+        self.prefix = prefix
+        self.output = output
+        self.pending = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        lines = (self.pending + text).split("\n")
+        self.pending = lines.pop()
+        if lines:
+            self.output.write("".join(f"{self.prefix}{line}\n" for line in lines))
+            self.output.flush()
+        return len(text)
+
+    def flush(self):
+        self.output.flush()
+
+def run_profile(run_operation, args: argparse.Namespace, profile: str, result_connection):
+    # runs in a process of its own, so each wiki has its own session, connection pool and rate limit
+    libmediawiki.reset_connection_state()
+    sys.stdout = sys.stderr = PrefixedOutput(f"[{profile}] ", sys.stdout)
+    libmediawiki.METRICS.start()
+    try:
+        status = "finished" if run_operation(args) else "failed"
+    except KeyboardInterrupt:
+        status = "interrupted"
+    result_connection.send((status, libmediawiki.METRICS.report()))
+    result_connection.close()
+
+def run_profiles(run_operation, args: argparse.Namespace, profiles: list[str], parallel: int = None) -> dict:
+    # runs the same operation against every profile at the same time, up to "parallel" at once.
+    # returns {profile: (status, report)}
+    # fork keeps the parsed arguments and loaded modules, so nothing has to be imported or parsed again
+    context = multiprocessing.get_context("fork")
+    parallel = len(profiles) if parallel is None or parallel <= 0 else parallel
+    pending = list(dict.fromkeys(profiles))
+    running = {}
+    results = {}
+    while pending or running:
+        while pending and len(running) < parallel:
+            profile = pending.pop(0)
+            profile_args = copy.copy(args)
+            profile_args.profile = profile
+            profile_args.profiles = None
+            for option in ('pagelist_path', 'save_path', 'queue_path', 'prometheus'):
+                if getattr(profile_args, option, None) is not None:
+                    setattr(profile_args, option, add_profile_name(getattr(profile_args, option), profile))
+            # the combined report is written once every wiki is done
+            profile_args.report = None
+            result_reader, result_writer = context.Pipe(duplex=False)
+            process = context.Process(target=run_profile, args=(run_operation, profile_args, profile, result_writer))
+            process.start()
+            result_writer.close()
+            running[result_reader] = (profile, process)
+        try:
+            ready = multiprocessing.connection.wait(list(running))
+        except KeyboardInterrupt:
+            # every process got the interrupt too, and stops after saving its progress
+            print("Waiting for each wiki to save its progress...")
+            pending = []
+            continue
+        for result_reader in ready:
+            profile, process = running.pop(result_reader)
+            try:
+                results[profile] = result_reader.recv()
+            except EOFError:
+                # the process ended without reporting back
+                results[profile] = ("failed", None)
+            process.join()
+    return {profile: results[profile] for profile in dict.fromkeys(profiles)}
+
+def print_summary(results: dict):
+    print("Summary:")
+    print(f"{'wiki':<20}{'saved':>8}{'skipped':>9}{'errors':>8}{'requests':>10}{'seconds':>9}  status")
+    totals = {'saved': 0, 'skipped': 0, 'error': 0, 'requests': 0}
+    for (profile, (status, report)) in results.items():
+        pages = report['pages'] if report is not None else {}
+        counts = {
+            'saved': pages.get('edited', 0) + pages.get('created', 0),
+            'skipped': pages.get('skipped', 0),
+            'error': pages.get('error', 0),
+            'requests': report['requests'] if report is not None else 0
+        }
+        for key in totals:
+            totals[key] += counts[key]
+        duration = report['duration'] if report is not None else 0
+        print(f"{profile:<20}{counts['saved']:>8}{counts['skipped']:>9}{counts['error']:>8}{counts['requests']:>10}" +
+            f"{duration:>9.1f}  {status}")
+    print(f"{'total':<20}{totals['saved']:>8}{totals['skipped']:>9}{totals['error']:>8}{totals['requests']:>10}")
+    if totals['error'] > 0:
+        print("Pages with errors are listed above and saved to the pagelist of their wiki.")
+
+def run_fanout(run_operation, args: argparse.Namespace, profiles_path: str):
+    profiles = list_profiles(profiles_path) if args.profiles == ["all"] else args.profiles
+    if not profiles:
+        raise Exception("No profiles saved. Run 'mediawiki_pybot save --profile NAME' to save credentials for each wiki.")
+    for profile in profiles:
+        credentials_path = get_profile_paths(profiles_path, profile)['credentials']
+        if not os.path.exists(credentials_path):
+            raise Exception(f"Profile '{profile}' not found. Run 'mediawiki_pybot save --profile {profile}' to save its credentials.")
+    print(f"Running {args.operation} on {len(profiles)} wikis: {', '.join(profiles)}")
+    results = run_profiles(run_operation, args, profiles, args.parallel)
+    print_summary(results)
+    if getattr(args, 'report', None) is not None:
+        utils.write_json(args.report, {profile: {'status': status, 'report': report}
+            for (profile, (status, report)) in results.items()})
@@ -0,0 +1,61 @@
+# standard library imports
+import os
+import time
+
+# pages recorded with these statuses are not processed again when resuming
+COMPLETED_STATUSES = ("edited", "skipped", "created")
+
+class Journal:
+    # Append-only record of the outcome of each page, one "status<TAB>pagename" line per page.
+    # Every record is flushed to the OS right away, so killing the process loses nothing.
+    # fsync is batched (every sync_count records or sync_interval seconds) to survive
+    # power loss without paying a disk sync per page.
+
+    def __init__(self, journal_path: str, resume: bool = False, sync_count: int = 100, sync_interval: float = 5):
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        self.journal_path = journal_path
+        self.sync_count = sync_count
+        self.sync_interval = sync_interval
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.journal_file = open(journal_path, "a" if resume else "w")
+        if resume and self.journal_file.tell() > 0:
+            # ending a line cut short by a crash, so it doesn't merge with the next record
+            with open(journal_path, "rb") as journal_file:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    self.journal_file.write("\n")
+
+    def record(self, pagename: str, status: str):
+        self.journal_file.write(f"{status}\t{pagename}\n")
+        self.journal_file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_count or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.journal_file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.journal_file.close()
+
+    def remove(self):
+        # the journal is no longer needed once the pagelist has been rewritten with the remaining pages
+        self.journal_file.close()
+        os.remove(self.journal_path)
+
+def read_journal(journal_path: str) -> dict:
+    # returns {pagename: status} with the latest status recorded for each page
+    statuses = {}
+    if os.path.exists(journal_path):
+        with open(journal_path) as journal_file:
+            for line in journal_file:
+                # a line cut short by a crash has no line break and is ignored
+                if not line.endswith("\n") or "\t" not in line:
+                    continue
+                status, pagename = line[:-1].split("\t", 1)
+                statuses[pagename] = status
+    return statuses
@@ -1,22 +1,253 @@
 # standard library imports
-import functools
+import itertools
 import os
+import queue
+import random
 import re
+import string
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 # dependencies
 import requests
+import urllib3
 # custom modules
+import lib.datasource as datasource
+import lib.prefilter as prefilter
 import lib.utils as utils
+from lib.journal import COMPLETED_STATUSES, Journal, read_journal
+from lib.metrics import Metrics
+from lib.pagelists import PagelistIndex, normalize_title
+from lib.ratelimit import RateLimiter
+from lib.revcache import RevisionCache
+from lib.substitution import SubstitutionList, read_substitutions
+from lib.transform import PageTransform, TransformWorker, print_profile
+from lib.workqueue import WorkQueue, format_counts
 
-SESSION = requests.Session()
-SESSION.request = functools.partial(SESSION.request, timeout=120)
+# max number of connections kept open to the API, shared by all threads
+POOL_SIZE = 10
+# timeouts in seconds for opening a connection and for waiting for the response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+# max number of attempts when the connection fails or the server returns an internal error.
+# the wait between attempts doubles every time (up to MAX_BACKOFF seconds), with random jitter
+MAX_NETWORK_RETRIES = 5
+BACKOFF_BASE = 1
+MAX_BACKOFF = 60
+# values configure_http goes back to for each new run
+HTTP_DEFAULTS = (POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_NETWORK_RETRIES)
+# https://www.mediawiki.org/wiki/API:Etiquette#The_User-Agent_header
+USER_AGENT = "mediawiki_pybot (https://github.com/wendellavila/mediawiki_pybot) python-requests/" + requests.__version__
+
+def set_connection_pool(session: requests.Session, pool_size: int):
+    # connections are kept alive and shared by every thread using the session.
+    # with pool_block, threads wait for a free connection instead of opening extra ones
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+def new_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': "gzip, deflate"})
+    set_connection_pool(session, POOL_SIZE)
+    return session
+
+SESSION = new_session()
+RATE_LIMITER = RateLimiter()
+METRICS = Metrics()
+# max number of seconds a request keeps being retried while the server reports lag or rate limiting
+MAX_THROTTLE_WAIT = 3600
+# CirrusSearch doesn't list results past this offset
+SEARCH_MAX_HITS = 10000
+# login state shared by every request, so an expired session can be renewed in the middle of a run
+AUTH = {'credentials_path': None, 'csrf_token': None}
+AUTH_LOCK = threading.Lock()
+
+def reset_connection_state():
+    # used by a process forked from a running one, which would otherwise share its cookies, login and
+    # open keep-alive connections. the inherited sockets are left untouched, they still belong to the parent
+    global SESSION, RATE_LIMITER, AUTH, AUTH_LOCK
+    SESSION = new_session()
+    RATE_LIMITER = RateLimiter()
+    AUTH = {'credentials_path': None, 'csrf_token': None}
+    AUTH_LOCK = threading.Lock()
+
+def reset_run_settings():
+    # used by the daemon before each job, so settings of a previous job (rate limit, maxlag, pool size)
+    # don't carry over. the session and login are kept
+    global RATE_LIMITER
+    RATE_LIMITER = RateLimiter()
+    (pool_size, connect_timeout, read_timeout, retries) = HTTP_DEFAULTS
+    configure_http(pool_size=pool_size if pool_size != POOL_SIZE else None, connect_timeout=connect_timeout,
+        read_timeout=read_timeout, retries=retries)
+
+def get_retry_after(request: requests.Response) -> float:
+    try:
+        return float(request.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+def configure_http(pool_size: int = None, connect_timeout: float = None, read_timeout: float = None, retries: int = None):
+    global POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_NETWORK_RETRIES
+    if pool_size is not None:
+        POOL_SIZE = pool_size
+        set_connection_pool(SESSION, pool_size)
+    CONNECT_TIMEOUT = connect_timeout if connect_timeout is not None else CONNECT_TIMEOUT
+    READ_TIMEOUT = read_timeout if read_timeout is not None else READ_TIMEOUT
+    MAX_NETWORK_RETRIES = retries if retries is not None else MAX_NETWORK_RETRIES
+
+def get_backoff(attempt: int) -> float:
+    # exponential backoff with full jitter, so threads failing together don't retry together
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt))
+
+def send_request(method: str, url: str, params: dict, repeatable: bool = True) -> requests.Response:
+    # retrying connection failures, timeouts and internal server errors.
+    # 429 and 503 responses with Retry-After are left to the rate limiter.
+    # requests that aren't repeatable (e.g. appending text) are only retried when the connection couldn't be
+    # opened, since after a read timeout or a server error the request may have been carried out already
+    for attempt in range(0, MAX_NETWORK_RETRIES):
+        try:
+            if method == "POST":
+                request = SESSION.post(url=url, data=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            else:
+                request = SESSION.get(url=url, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except (requests.Timeout, requests.ConnectionError) as e:
+            error = type(e).__name__
+            # nothing reached the server if the connection couldn't be opened
+            reason = getattr(e.args[0], 'reason', None) if e.args else None
+            sent = not (isinstance(e, requests.ConnectTimeout) or isinstance(reason, urllib3.exceptions.NewConnectionError))
+        else:
+            # bytes on the wire: compressed size when the server sent it, request url and body
+            METRICS.record_request(len(request.request.url) + len(request.request.body or ""),
+                int(request.headers.get('Content-Length', len(request.content))))
+            if request.status_code < 500 or get_retry_after(request) is not None:
+                return request
+            error = f"HTTP {request.status_code}"
+            sent = True
+        METRICS.record_error(error)
+        if sent and not repeatable:
+            raise Exception(f"Request failed ({error}) after being sent. It may have been saved already, " +
+                "check the page before running it again.")
+        if attempt + 1 < MAX_NETWORK_RETRIES:
+            backoff = get_backoff(attempt)
+            print(f"Connection with API failed ({error}). Retrying in {backoff:.1f}s. ({attempt+1} of {MAX_NETWORK_RETRIES - 1})")
+            with METRICS.timer("sleep"):
+                time.sleep(backoff)
+    raise Exception(f"Request failed {MAX_NETWORK_RETRIES} times ({error}). Check your connection and try again.")
+
+def api_request(method: str, url: str, params: dict) -> dict:
+    # https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+    # every API call goes through the shared rate limiter, which holds requests
+    # while the servers are lagged and spaces edits to the configured rate
+    if RATE_LIMITER.maxlag is not None:
+        params = {**params, 'maxlag': RATE_LIMITER.maxlag}
+    # requests are always sent with the CSRF token of the current session
+    if 'token' in params and AUTH['csrf_token'] is not None:
+        params = {**params, 'token': AUTH['csrf_token']}
+    is_edit = params.get('action') == "edit"
+    # sending appended or prepended text twice would add it twice
+    repeatable = not (is_edit and ('appendtext' in params or 'prependtext' in params))
+    session_renewed = False
+    # pause asked of every request while the servers stay lagged, and when the request was first throttled
+    lag_pause = 0
+    throttled_since = None
+
+    while True:
+        with METRICS.timer("sleep"):
+            if is_edit:
+                RATE_LIMITER.wait_edit()
+            else:
+                RATE_LIMITER.wait()
+
+        request = send_request(method, url, params, repeatable)
+        retry_after = get_retry_after(request)
+        if request.status_code in (429, 503) and retry_after is not None:
+            METRICS.record_error(f"HTTP {request.status_code}")
+            # 429 is rate limiting, 503 an overloaded server, handled like lag
+            error_code = "ratelimited" if request.status_code == 429 else "maxlag"
+        else:
+            try:
+                data = request.json()
+            except ValueError:
+                raise Exception(f"API returned an invalid response (HTTP {request.status_code}). Check the url in saved credentials.")
+            error_code = data['error'].get('code') if isinstance(data.get('error'), dict) else None
+            if error_code is not None:
+                METRICS.record_error(error_code)
+        if error_code in ("maxlag", "ratelimited"):
+            throttled_since = time.monotonic() if throttled_since is None else throttled_since
+            if time.monotonic() - throttled_since > MAX_THROTTLE_WAIT:
+                raise Exception(f"Server is too busy: request was throttled for more than {MAX_THROTTLE_WAIT // 60} minutes. " +
+                    "Try again later.")
+            if error_code == "ratelimited" or is_edit:
+                RATE_LIMITER.backoff(retry_after)
+            else:
+                # lag reported to a read only holds requests until it goes down, without slowing edits down afterwards
+                lag_pause = max(retry_after or 1, min(RATE_LIMITER.MAX_PAUSE, lag_pause * RATE_LIMITER.BACKOFF_FACTOR))
+                RATE_LIMITER.lag(lag_pause)
+            continue
+        # https://www.mediawiki.org/wiki/API:Assert
+        if error_code in ("badtoken", "assertuserfailed") and 'token' in params and not session_renewed \
+        and AUTH['credentials_path'] is not None:
+            renew_session(params['token'])
+            params = {**params, 'token': AUTH['csrf_token']}
+            session_renewed = True
+            continue
+
+        if is_edit and error_code is None:
+            RATE_LIMITER.success()
+        return data
+
+def set_rate_limit(max_rate: float = None, delay: int = None, maxlag: int = None):
+    # a fixed delay is kept as a ceiling of one edit every "delay" seconds
+    if max_rate is None and delay is not None and delay > 0:
+        max_rate = 60 / delay
+    RATE_LIMITER.configure(max_rate=max_rate, maxlag=maxlag)
+
+def get_session_path(credentials_path: str) -> str:
+    return os.path.join(os.path.dirname(credentials_path), "session.json")
+
+def save_session(credentials_path: str, credentials: dict, csrf_token: str):
+    # session cookies and CSRF token are kept next to the credentials, so the next run doesn't need to login again
+    cookies = [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+        'secure': cookie.secure, 'expires': cookie.expires} for cookie in SESSION.cookies]
+    session = {'username': credentials['username'], 'url': credentials['url'], 'csrftoken': csrf_token, 'cookies': cookies}
+    utils.write_json(get_session_path(credentials_path), session, private=True)
+
+def load_session(credentials_path: str, credentials: dict) -> str:
+    # restores a saved session and returns its CSRF token, or None if there's no session for these credentials
+    session = utils.read_json(get_session_path(credentials_path))
+    if session is None or session.get('username') != credentials['username'] or session.get('url') != credentials['url']:
+        return None
+    for cookie in session['cookies']:
+        SESSION.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'],
+            secure=cookie['secure'], expires=cookie['expires'])
+    return session['csrftoken']
+
+def renew_session(failed_token: str):
+    # logging in again after the API rejected the saved session or token.
+    # if another thread already renewed the session, its token is used instead
+    with AUTH_LOCK:
+        if AUTH['csrf_token'] != failed_token:
+            return
+        credentials = utils.read_credentials(AUTH['credentials_path'])
+        print("Session expired. Logging in again...")
+        SESSION.cookies.clear()
+        AUTH['csrf_token'] = login(username=credentials['username'], password=credentials['password'], url=credentials['url'])
+        save_session(AUTH['credentials_path'], credentials, AUTH['csrf_token'])
 
 def get_token(credentials_path: str) -> str:
     credentials = utils.read_credentials(credentials_path)
     if credentials['username'] is None or credentials['password'] is None or credentials['url'] is None:
         raise Exception("Unable to login: Saved credentials partially missing. Run 'mediawiki_pybot save' to save credentials.")
     else:
-        CSRF_TOKEN = login(username=credentials['username'], password=credentials['password'],url=credentials['url'])
+        AUTH['credentials_path'] = credentials_path
+        CSRF_TOKEN = load_session(credentials_path, credentials)
+        if CSRF_TOKEN is not None:
+            print(credentials['username'] + ": Using saved session.")
+        else:
+            CSRF_TOKEN = login(username=credentials['username'], password=credentials['password'],url=credentials['url'])
+            save_session(credentials_path, credentials, CSRF_TOKEN)
+        AUTH['csrf_token'] = CSRF_TOKEN
         return CSRF_TOKEN
 
 def get_url(credentials_path: str) -> str:
@@ -35,18 +266,7 @@ def login(username: str, password: str, url:str) -> str:
         'format':"json"
     }
 
-    # retry when request timeout is reached 
-    for i in range(0, 3):
-        try:
-            request = SESSION.get(url=url, params=LOGIN_TOKEN_PARAMS)
-        except requests.Timeout:
-            print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-        else:
-            break
-    else:
-        raise Exception("Request reached timeout while fetching data. Check your connection and try again.")
-
-    data = request.json()
+    data = api_request("GET", url, LOGIN_TOKEN_PARAMS)
 
     if 'error' in data:
         raise Exception(data['error'])
@@ -64,18 +284,7 @@ def login(username: str, password: str, url:str) -> str:
         'format': "json"
     }
 
-    # retry when request timeout is reached 
-    for i in range(0, 3):
-        try:
-            request = SESSION.post(url, data=LOGIN_PARAMS)
-        except requests.Timeout:
-            print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-        else:
-            break
-    else:
-        raise Exception("Request reached timeout while fetching data. Check your connection and try again.")
-
-    data = request.json()
+    data = api_request("POST", url, LOGIN_PARAMS)
 
     if 'error' in data:
         raise Exception(data['error'])
@@ -92,18 +301,7 @@ def login(username: str, password: str, url:str) -> str:
         "format": "json"
     }
 
-    # retry when request timeout is reached 
-    for i in range(0, 3):
-        try:
-            request = SESSION.get(url=url, params=CSRF_PARAMS)
-        except requests.Timeout:
-            print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-        else:
-            break
-    else:
-        raise Exception("Request reached timeout while fetching data. Check your connection and try again.")
-
-    data = request.json()
+    data = api_request("GET", url, CSRF_PARAMS)
     CSRF_TOKEN = data['query']['tokens']['csrftoken']
     
     return CSRF_TOKEN
@@ -145,10 +343,7 @@ def set_api_request_limit(pagelist_source: str, pagelist_target: str, params: di
 
     return params
     
-def generate_pagelist(url: str, pagelist_source: str, pagelist_target: str, namespace: str = "*", limit: int = None) -> list[str]:
-    if url is None:
-        raise Exception("Unable to get pages: url is missing from saved credentials. " + 
-        "Run 'mediawiki_pybot save' to save credentials.")
+def format_namespace(namespace: str) -> str:
     if namespace is None:
         namespace = '*'
     if namespace != '*':
@@ -159,9 +354,108 @@ def generate_pagelist(url: str, pagelist_source: str, pagelist_target: str, name
         namespace = re.sub(r"^\||\|$", "", namespace)
         # Turning errors like "-1-2|3" into "-1|-2|3"
         namespace = re.sub(r"(\d)-(\d)", r"\1|-\2", namespace)
-    
+    return namespace
+
+def get_members(url: str, pagelist_source: str, title: str, namespace: str = "*") -> list[dict]:
+    # returns every page ({'ns', 'title'}) in a category, linking to a page or transcluding a page
+    params = {
+        'action': "query",
+        'format': "json",
+        'formatversion': 2
+    }
+    if pagelist_source == 'category':
+        # https://www.mediawiki.org/wiki/API:Categorymembers
+        params.update({'list': "categorymembers", 'cmtitle': title, 'cmprop': "title", 'cmnamespace': namespace, 'cmlimit': 500})
+    elif pagelist_source == 'linkshere':
+        # https://www.mediawiki.org/wiki/API:Linkshere
+        params.update({'prop': "linkshere", 'titles': title, 'lhprop': "title", 'lhnamespace': namespace, 'lhlimit': 500})
+    elif pagelist_source == 'transcludedin':
+        # https://www.mediawiki.org/wiki/API:Transcludedin
+        params.update({'prop': "transcludedin", 'titles': title, 'tiprop': "title", 'tinamespace': namespace, 'tilimit': 500})
+    else:
+        raise Exception("Recursive pagelists are only supported for category, linkshere and transcludedin sources.")
+
+    pages = []
+    while True:
+        data = api_request("GET", url, params)
+        if 'error' in data:
+            raise Exception(data['error'])
+        if pagelist_source == 'category':
+            pages += data['query']['categorymembers']
+        else:
+            pages += data['query']['pages'][0].get(pagelist_source, [])
+
+        # https://www.mediawiki.org/wiki/API:Continue
+        if 'continue' in data:
+            params.update(data['continue'])
+        else:
+            break
+    return pages
+
+def generate_recursive_pagelist(url: str, pagelist_source: str, pagelist_target: str, namespace: str = "*",
+limit: int = None, depth: int = None, workers: int = 4):
+    # walks the graph breadth-first from pagelist_target, with up to "workers" requests in flight,
+    # yielding (pagenames, None) for each page visited.
+    # category: follows subcategories, pages outside the namespace filter are only left out of the results.
+    # linkshere/transcludedin: follows every page found, only within the namespace filter
+    NAMESPACES = [int(ns) for ns in namespace.split('|') if ns.strip().isdigit()] if namespace != "*" else []
+    CATEGORY_NAMESPACE = 14
+    if pagelist_source == 'category':
+        pagelist_target = pagelist_target[9:] if pagelist_target[0:9].lower() == "category:" else pagelist_target
+        pagelist_target = "Category:" + pagelist_target
+        query_namespace = namespace if namespace == "*" or CATEGORY_NAMESPACE in NAMESPACES else f"{namespace}|{CATEGORY_NAMESPACE}"
+    else:
+        query_namespace = namespace
+
+    if workers > POOL_SIZE:
+        configure_http(pool_size=workers)
+    # the root is compared with titles returned by the API, so it's written the same way (e.g. Category:a is Category:A)
+    pagelist_target = get_page_info(url, [pagelist_target])[pagelist_target][0]['title']
+    visited = {pagelist_target}
+    page_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(get_members, url, pagelist_source, pagelist_target, query_namespace): 0}
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    level = futures.pop(future)
+                    pagelist = []
+                    for page in future.result():
+                        # the visited set keeps cycles from being followed more than once
+                        if page['title'] in visited:
+                            continue
+                        visited.add(page['title'])
+                        if not NAMESPACES or page['ns'] in NAMESPACES:
+                            pagelist.append(page['title'])
+                        # only subcategories are followed in category trees
+                        if (depth is None or level < depth) and (pagelist_source != 'category' or page['ns'] == CATEGORY_NAMESPACE):
+                            futures[executor.submit(get_members, url, pagelist_source, page['title'], query_namespace)] = level + 1
+
+                    if limit is not None and page_count + len(pagelist) >= limit:
+                        yield pagelist[:limit - page_count], None
+                        return
+                    page_count += len(pagelist)
+                    yield pagelist, None
+        finally:
+            for future in futures:
+                future.cancel()
+
+def generate_pagelist(url: str, pagelist_source: str, pagelist_target: str, namespace: str = "*", limit: int = None,
+continue_params: dict = None, page_count: int = 0, recursive: bool = False, depth: int = None, workers: int = 4):
+    # yields (pagenames, continue_params) as each continuation batch arrives.
+    # continue_params is what a new call needs to resume after that batch, or None after the last batch
+    if url is None:
+        raise Exception("Unable to get pages: url is missing from saved credentials. " + 
+        "Run 'mediawiki_pybot save' to save credentials.")
+    namespace = format_namespace(namespace)
+
     pagelist_source = pagelist_source.lower()
-    pagelist = []
+    if recursive:
+        yield from generate_recursive_pagelist(url=url, pagelist_source=pagelist_source, pagelist_target=pagelist_target,
+        namespace=namespace, limit=limit, depth=depth, workers=workers)
+        return
+
     params = {
         'action': "query",
         'format': "json",
@@ -172,9 +466,9 @@ def generate_pagelist(url: str, pagelist_source: str, pagelist_target: str, name
         "linkshere", "fileusage", "images","links", "redirects",
         "templates", "transcludedin", "search")
 
-    #to do: subcategories, recursive whatlinks here, recursive transcludedin
     if pagelist_source == 'manual':
-        return pagelist_target.split(",")
+        yield pagelist_target.split(","), None
+        return
     elif pagelist_source == 'category':
         # https://www.mediawiki.org/wiki/API:Categorymembers
         pagelist_target = pagelist_target[9:] if pagelist_target[0:9].lower() == "category:" else pagelist_target
@@ -216,119 +510,654 @@ def generate_pagelist(url: str, pagelist_source: str, pagelist_target: str, name
         raise Exception("Unsupported pagelist source.")
     
     # max limit per request is 500
-    request_limit = 500 if limit is None or limit >= 500 else limit
+    request_limit = 500 if limit is None or (limit - page_count) >= 500 else (limit - page_count)
     params = set_api_request_limit(pagelist_source, pagelist_target, params, request_limit)
+    if continue_params is not None:
+        params.update(continue_params)
 
-    pagelist = []
-    print("Generating pagelist...")
-    try:
-        while request_limit > 0:
+    while request_limit > 0:
+        data = api_request("GET", url, params)
+        if 'error' in data:
+            raise Exception(data['error'])
 
-            # retry when request timeout is reached 
-            for i in range(0, 3):
-                try:
-                    request = SESSION.get(url=url, params=params)
-                except requests.Timeout:
-                    print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-                else:
-                    break
-            else:
-                raise Exception("Request reached timeout while fetching data. Check your connection and try again.")
-            
-            data = request.json()
-            if 'error' in data:
-                raise Exception(data['error'])
-            
-            if pagelist_source == 'category':
-                pagelist += [page['title'] for page in data['query']['categorymembers']]
-            elif pagelist_source in ['usercontribs', 'search']:
-                pagelist += [page['title'] for page in data['query'][pagelist_source]]
-            elif pagelist_source == 'specialpage':
-                if pagelist_target.lower() == 'newfiles' or pagelist_target.lower() == 'newimages':
-                    pagelist += [page['title'] for page in data['query']['logevents']]
-                elif pagelist_target.lower() == 'newpages':
-                    pagelist += [page['title'] for page in data['query']['logevents']]
-                else:
-                    pagelist += [page['title'] for page in data['query']['querypage']['results']]
+        pagelist = []
+        if pagelist_source == 'category':
+            pagelist = [page['title'] for page in data['query']['categorymembers']]
+        elif pagelist_source in ['usercontribs', 'search']:
+            pagelist = [page['title'] for page in data['query'][pagelist_source]]
+        elif pagelist_source == 'specialpage':
+            if pagelist_target.lower() == 'newfiles' or pagelist_target.lower() == 'newimages':
+                pagelist = [page['title'] for page in data['query']['logevents']]
+            elif pagelist_target.lower() == 'newpages':
+                pagelist = [page['title'] for page in data['query']['logevents']]
             else:
-                # QUERY_PROPS
-                NAMESPACES = [int(ns) for ns in namespace.split('|') if ns.strip().isdigit()] if namespace != "*" else []
-                if pagelist_source in data['query']['pages'][0]:
-                    for page in data['query']['pages'][0][pagelist_source]:
-                        if namespace == "*":
+                pagelist = [page['title'] for page in data['query']['querypage']['results']]
+        else:
+            # QUERY_PROPS
+            NAMESPACES = [int(ns) for ns in namespace.split('|') if ns.strip().isdigit()] if namespace != "*" else []
+            if pagelist_source in data['query']['pages'][0]:
+                for page in data['query']['pages'][0][pagelist_source]:
+                    if namespace == "*":
+                        pagelist.append(page['title'])
+                    else:
+                        if page['ns'] in NAMESPACES:
                             pagelist.append(page['title'])
-                        else:
-                            if page['ns'] in NAMESPACES:
-                                pagelist.append(page['title'])
-            
-            # https://www.mediawiki.org/wiki/API:Continue
-
-            CONTINUE_PARAMS = (
-                'qpoffset',
-                'sroffset',
-                'rccontinue',
-                'lecontinue',
-                'lhcontinue',
-                'fucontinue',
-                'imcontinue',
-                'plcontinue',
-                'rdcontinue',
-                'tlcontinue',
-                'ticontinue',
-                'continue'
-            )
-
-            hasContinue = False
-            for param in CONTINUE_PARAMS:
-                if param in data:
-                    hasContinue = True
-                    params.update(data[param])
-                    break
-
-            if not hasContinue:
+        page_count += len(pagelist)
+
+        # https://www.mediawiki.org/wiki/API:Continue
+
+        CONTINUE_PARAMS = (
+            'qpoffset',
+            'sroffset',
+            'rccontinue',
+            'lecontinue',
+            'lhcontinue',
+            'fucontinue',
+            'imcontinue',
+            'plcontinue',
+            'rdcontinue',
+            'tlcontinue',
+            'ticontinue',
+            'continue'
+        )
+
+        continue_params = None
+        for param in CONTINUE_PARAMS:
+            if param in data:
+                continue_params = data[param]
+                params.update(continue_params)
                 break
 
-            # reducing request limit when total of pages gets closer to user provided limit
-            if limit is not None:
-                request_limit = (limit - len(pagelist)) if (limit - len(pagelist)) < 500 else 500
-                params = set_api_request_limit(pagelist_source, pagelist_target, params, request_limit)
-    except KeyboardInterrupt:
-        print("Execution interrupted by user input.")
-        if len(pagelist) > 0:
-            print(f"{len(pagelist)} pagenames were retrieved before interruption and saved successfully.")
+        # reducing request limit when total of pages gets closer to user provided limit
+        if limit is not None:
+            request_limit = (limit - page_count) if (limit - page_count) < 500 else 500
+            params = set_api_request_limit(pagelist_source, pagelist_target, params, request_limit)
+
+        yield pagelist, continue_params if request_limit > 0 else None
+
+        if continue_params is None:
+            break
+
+def save_pagelist(url: str, pagelist_path: str, pagelist_mode: str, pagelist_source: str, pagelist_target: str,
+namespace: str = None, limit: int = None, resume: bool = False, recursive: bool = False, depth: int = None, workers: int = 4) -> int:
+    # writes pages to the pagelist as each batch arrives. after every batch, the continuation needed
+    # to carry on is saved next to the pagelist, so an interrupted generation can be resumed
+    state_path = pagelist_path + ".continue.json"
+    state = {
+        'source': pagelist_source,
+        'target': pagelist_target,
+        'namespace': namespace,
+        'limit': limit,
+        'continue': None,
+        'page_count': 0,
+        'added_count': 0
+    }
+    if resume and recursive:
+        raise Exception("Recursive pagelist generation can't be resumed.")
+    if resume:
+        saved_state = utils.read_json(state_path)
+        if saved_state is not None and all(saved_state[key] == state[key] for key in ('source', 'target', 'namespace', 'limit')):
+            state = saved_state
+            pagelist_mode = "a"
+            if state['continue'] is None and state['page_count'] > 0:
+                print("Pagelist generation with given parameters was already completed.")
+                os.remove(state_path)
+                return 0
+            print(f"Resuming pagelist generation after {state['page_count']} pages.")
         else:
-            print(f"No pagenames were retrieved before interruption.")
-    except Exception as e:
-        print(f"An error has ocurred: {e}")
-        print(f"{len(pagelist)} pagenames were retrieved before error and saved successfully.")
-    return pagelist
+            print("No interrupted pagelist generation found with given parameters. Starting from the beginning.")
 
-def edit_pages(csrf_token: str, url: str, pagelist_path: str = None, substitution_path: str = None, append: str = None, prepend: str = None,
-skip_if: str = None, skip_ifnot: str = None, delay: int = None, summary: str = None):
-    if substitution_path is None and append is None and prepend is None:
-        raise Exception("No modifications to be performed.")
+    page_count = state['page_count']
+    added_count = state['added_count']
+    print("Generating pagelist...")
+    os.makedirs(os.path.dirname(os.path.abspath(pagelist_path)), exist_ok=True)
+    # titles already in the pagelist are not added again
+    index = PagelistIndex(pagelist_path if pagelist_mode == "a" else None)
+    with open(pagelist_path, pagelist_mode) as pagelist_file:
+        try:
+            for (pagelist, continue_params) in generate_pagelist(url=url, pagelist_source=pagelist_source,
+            pagelist_target=pagelist_target, namespace=namespace, limit=limit,
+            continue_params=state['continue'], page_count=state['page_count'],
+            recursive=recursive, depth=depth, workers=workers):
+                added = index.add(pagelist)
+                for pagename in added:
+                    pagelist_file.write("{}\n".format(pagename))
+                pagelist_file.flush()
+                os.fsync(pagelist_file.fileno())
+                page_count += len(pagelist)
+                added_count += len(added)
+                state['continue'] = continue_params
+                state['page_count'] = page_count
+                state['added_count'] = added_count
+                if not recursive:
+                    utils.write_json(state_path, state)
+        except KeyboardInterrupt:
+            print("Execution interrupted by user input.")
+            print(f"{added_count} pagenames were retrieved before interruption and saved successfully.")
+            return added_count
+        except Exception as e:
+            print(f"An error has ocurred: {e}")
+            print(f"{added_count} pagenames were retrieved before error and saved successfully.")
+            return added_count
+        finally:
+            index.close()
 
-    substitution_list = []
-    if substitution_path is not None and os.path.exists(substitution_path):
-        with open(substitution_path) as substitution_file:
-            for line in substitution_file.readlines():
-                match = re.search(r'^"(.*)" "(.*)"', line)
-                if match:
-                    substitution_list.append((match.group(1), match.group(2)))
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return added_count
 
-    pagelist = utils.read_pagelist(pagelist_path)
-    
+def get_titles_limit(url: str) -> int:
+    # https://www.mediawiki.org/wiki/API:Userinfo
+    # max number of titles per request is 50, or 500 for accounts with the apihighlimits right
+    params = {
+        'action': "query",
+        'format': "json",
+        'formatversion': 2,
+        'meta': "userinfo",
+        'uiprop': "rights"
+    }
+
+    data = api_request("GET", url, params)
+    if 'error' in data:
+        raise Exception(data['error'])
+
+    return 500 if 'apihighlimits' in data['query']['userinfo'].get('rights', []) else 50
+
+def query_pages(url: str, pagenames: list[str], params: dict) -> dict:
+    # returns {pagename: (page, curtimestamp)} for every given pagename, following title normalization.
+    # with the redirects parameter, the page a redirect points to is returned for the redirect
+    params = {
+        **params,
+        'action': "query",
+        'format': "json",
+        'formatversion': 2,
+        'curtimestamp': True,
+        'titles': "|".join(pagenames)
+    }
+
+    pages = {}
+    normalized = {}
+    redirects = {}
+    curtimestamp = None
+    while True:
+        data = api_request("GET", url, params)
+        if 'error' in data:
+            raise Exception(data['error'])
+
+        curtimestamp = data['curtimestamp'] if curtimestamp is None else curtimestamp
+        for title in data['query'].get('normalized', []):
+            normalized[title['from']] = title['to']
+        # https://www.mediawiki.org/wiki/API:Query#Resolving_redirects
+        for title in data['query'].get('redirects', []):
+            redirects[title['from']] = title['to']
+        for page in data['query'].get('pages', []):
+            # content too large for a single response is sent in the following continuation
+            if page['title'] not in pages or 'revisions' in page:
+                pages[page['title']] = page
+
+        # https://www.mediawiki.org/wiki/API:Continue
+        if 'continue' in data:
+            params.update(data['continue'])
+        else:
+            break
+
+    results = {}
+    for pagename in pagenames:
+        title = normalized.get(pagename, pagename)
+        title = redirects.get(title, title)
+        results[pagename] = (pages.get(title, {'title': title, 'missing': True}), curtimestamp)
+    return results
+
+def get_pages(url: str, pagenames: list[str]) -> dict:
     # https://www.mediawiki.org/wiki/API:Revisions
-    getpage_params = {
+    # rvlimit can't be used with multiple titles, the latest revision of each page is returned by default.
+    # redirects are resolved by the API, returning the content of the page they point to
+    params = {
+        'prop': "revisions",
+        'rvprop': "ids|timestamp|content",
+        'rvslots': "main",
+        'redirects': True
+    }
+    return query_pages(url, pagenames, params)
+
+def get_page_info(url: str, pagenames: list[str], redirects: bool = False) -> dict:
+    # https://www.mediawiki.org/wiki/API:Info
+    params = {'prop': "info"}
+    if redirects:
+        params['redirects'] = True
+    return query_pages(url, pagenames, params)
+
+def get_cached_pages(url: str, pagenames: list[str], revision_cache: RevisionCache) -> dict:
+    # checking the latest revision id of each page first, and only downloading content missing from the cache
+    pages = get_page_info(url, pagenames, redirects=True)
+    cached = revision_cache.get({page['title']: page['lastrevid'] for (page, _) in pages.values() if 'lastrevid' in page})
+    # redirects were resolved already, so pages are downloaded by their own title, once per batch
+    not_cached = list(dict.fromkeys(page['title'] for (page, _) in pages.values() if 'lastrevid' in page and page['title'] not in cached))
+    downloaded = get_pages(url, not_cached) if not_cached else {}
+    revision_cache.put({page['title']: page['revisions'][0] for (page, _) in downloaded.values() if 'revisions' in page})
+
+    for (pagename, (page, curtimestamp)) in pages.items():
+        if page['title'] in downloaded:
+            pages[pagename] = downloaded[page['title']]
+        elif page['title'] in cached:
+            pages[pagename] = ({**page, 'revisions': [cached[page['title']]]}, curtimestamp)
+    return pages
+
+def fetch_pages(url: str, pagelist: list[str], batch_size: int, revision_cache: RevisionCache = None, content: bool = True):
+    # fetching content for many pages per request, yielding (pagename, page, curtimestamp) one page at a time.
+    # without content, only page info is fetched, still resolving redirects and finding missing pages
+    for batch_start in range(0, len(pagelist), batch_size):
+        batch = pagelist[batch_start:batch_start + batch_size]
+        if not content:
+            pages = get_page_info(url, list(dict.fromkeys(batch)), redirects=True)
+        elif revision_cache is not None:
+            pages = get_cached_pages(url, list(dict.fromkeys(batch)), revision_cache)
+        else:
+            pages = get_pages(url, list(dict.fromkeys(batch)))
+        for pagename in batch:
+            page, curtimestamp = pages[pagename]
+            yield pagename, page, curtimestamp
+
+def fetch_queued_pages(url: str, work_queue: WorkQueue, batch_size: int, revision_cache: RevisionCache = None, content: bool = True):
+    # claiming one batch of titles from the shared queue at a time, until there are none left
+    while True:
+        batch = work_queue.claim(batch_size)
+        if not batch:
+            return
+        yield from fetch_pages(url, batch, batch_size, revision_cache, content)
+
+def set_generator_params(pagelist_source: str, pagelist_target: str, namespace: str, params: dict, limit: int) -> dict:
+    # https://www.mediawiki.org/wiki/API:Query#Generators
+    # list and prop modules that can be used as generators, with their parameter prefixes
+    GENERATOR_PROPS = {
+        "linkshere": "lh", "fileusage": "fu", "images": "im", "links": "pl",
+        "redirects": "rd", "templates": "tl", "transcludedin": "ti"}
+
+    if pagelist_source == 'category':
+        # https://www.mediawiki.org/wiki/API:Categorymembers
+        pagelist_target = pagelist_target[9:] if pagelist_target[0:9].lower() == "category:" else pagelist_target
+        params['generator'] = "categorymembers"
+        params['gcmtitle'] = "Category:" + pagelist_target
+        params['gcmnamespace'] = namespace
+        params['gcmlimit'] = limit
+    elif pagelist_source == 'specialpage':
+        pagelist_target = pagelist_target[8:] if pagelist_target[0:8].lower() == "special:" else pagelist_target
+        if pagelist_target.lower() == 'newpages':
+            # https://www.mediawiki.org/wiki/API:RecentChanges
+            params['generator'] = "recentchanges"
+            params['grctype'] = "new"
+            params['grcnamespace'] = 0
+            params['grclimit'] = limit
+        elif pagelist_target.lower() == 'newfiles':
+            # https://www.mediawiki.org/wiki/API:Allimages
+            params['generator'] = "allimages"
+            params['gaisort'] = "timestamp"
+            params['gaidir'] = "descending"
+            params['gailimit'] = limit
+        else:
+            # https://www.mediawiki.org/wiki/API:Querypage
+            params['generator'] = "querypage"
+            params['gqppage'] = pagelist_target
+            params['gqplimit'] = limit
+    elif pagelist_source == 'search':
+        # https://www.mediawiki.org/wiki/API:Search
+        params['generator'] = "search"
+        params['gsrsearch'] = pagelist_target
+        params['gsrnamespace'] = namespace
+        params['gsrlimit'] = limit
+    elif pagelist_source in GENERATOR_PROPS:
+        # https://www.mediawiki.org/wiki/API:Properties
+        prefix = "g" + GENERATOR_PROPS[pagelist_source]
+        params['generator'] = pagelist_source
+        params['titles'] = pagelist_target
+        params[prefix + 'limit'] = limit
+        if pagelist_source != 'images':
+            params[prefix + 'namespace'] = namespace
+    else:
+        raise Exception(f"Pages can't be edited directly from source '{pagelist_source}'. Generate a pagelist first.")
+    return params
+
+def generate_pages(url: str, pagelist_source: str, pagelist_target: str, namespace: str = "*", limit: int = None,
+batch_size: int = 50, content: bool = True):
+    # listing pages and fetching their content in the same requests, yielding (pagename, page, curtimestamp).
+    # content is only complete once the API reports batchcomplete, so pages are held until then.
+    # without content, page info is fetched instead
+    if url is None:
+        raise Exception("Unable to get pages: url is missing from saved credentials. " +
+        "Run 'mediawiki_pybot save' to save credentials.")
+    namespace = format_namespace(namespace)
+    # https://www.mediawiki.org/wiki/API:Revisions
+    query_params = {
         'action': "query",
         'format': "json",
         'formatversion': 2,
+        'curtimestamp': True,
         'prop': "revisions",
         'rvprop': "ids|timestamp|content",
         'rvslots': "main",
-        'rvlimit': 1,
-        'curtimestamp': True
+        'redirects': True
     }
+    if not content:
+        # https://www.mediawiki.org/wiki/API:Info
+        query_params['prop'] = "info"
+        del query_params['rvprop'], query_params['rvslots']
+    query_params = set_generator_params(pagelist_source.lower(), pagelist_target, namespace, query_params,
+        batch_size if limit is None else min(batch_size, limit))
+
+    params = query_params
+    pages = {}
+    page_count = 0
+    while True:
+        data = api_request("GET", url, params)
+        if 'error' in data:
+            raise Exception(data['error'])
+
+        for page in data.get('query', {}).get('pages', []):
+            # content too large for a single response is sent in the following continuation
+            if page['title'] not in pages or 'revisions' in page:
+                pages[page['title']] = page
+
+        if 'batchcomplete' in data:
+            for page in pages.values():
+                yield page['title'], page, data['curtimestamp']
+                page_count += 1
+                if limit is not None and page_count >= limit:
+                    return
+            pages = {}
+
+        # https://www.mediawiki.org/wiki/API:Continue
+        # continuation values are added to the original parameters, so values from a finished batch are not carried over
+        if 'continue' in data:
+            params = {**query_params, **data['continue']}
+        else:
+            break
+
+def get_extensions(url: str) -> set[str]:
+    # https://www.mediawiki.org/wiki/API:Siteinfo
+    params = {
+        'action': "query",
+        'format': "json",
+        'formatversion': 2,
+        'meta': "siteinfo",
+        'siprop': "extensions"
+    }
+
+    data = api_request("GET", url, params)
+    if 'error' in data:
+        raise Exception(data['error'])
+
+    return {extension['name'] for extension in data['query'].get('extensions', [])}
+
+def search_candidates(url: str, pattern: str, max_hits: int = SEARCH_MAX_HITS) -> set[str]:
+    # https://www.mediawiki.org/wiki/Help:CirrusSearch#Insource
+    # asks the search backend which pages have source that can match pattern, returning their titles as the API
+    # writes them. returns None when the pages can't all be listed this way, so every page has to be downloaded instead
+    query = prefilter.insource_query(pattern)
+    if query is None:
+        print("Search prefilter not used: the condition can't be turned into a search query.")
+        return None
+    # without CirrusSearch, insource: isn't understood and the default search would leave pages out
+    if "CirrusSearch" not in get_extensions(url):
+        print("Search prefilter not used: the wiki doesn't have the CirrusSearch extension.")
+        return None
+
+    # https://www.mediawiki.org/wiki/API:Search
+    params = {
+        'action': "query",
+        'format': "json",
+        'formatversion': 2,
+        'list': "search",
+        'srsearch': query,
+        'srnamespace': "*",
+        'srlimit': 1,
+        'srinfo': "totalhits",
+        'srprop': ""
+    }
+    data = api_request("GET", url, params)
+    if 'error' in data or 'warnings' in data:
+        print(f"Search prefilter not used: search for {query} failed.")
+        return None
+    total_hits = data['query']['searchinfo']['totalhits']
+    if total_hits > max_hits:
+        print(f"Search prefilter not used: {total_hits} pages found, more than the {max_hits} that can be listed.")
+        return None
+
+    params = {
+        **params,
+        'srlimit': "max",
+        'srinfo': ""
+    }
+    titles = set()
+    while True:
+        data = api_request("GET", url, params)
+        # timeouts of regex searches are reported as warnings, with only part of the results
+        if 'error' in data or 'warnings' in data:
+            print(f"Search prefilter not used: search for {query} failed.")
+            return None
+        titles.update(page['title'] for page in data['query']['search'])
+
+        # https://www.mediawiki.org/wiki/API:Continue
+        if 'continue' in data:
+            params.update(data['continue'])
+        else:
+            break
+    # the wiki can stop listing results before the limit expected here
+    if len(titles) < total_hits:
+        print(f"Search prefilter not used: only {len(titles)} of {total_hits} pages found could be listed.")
+        return None
+    return titles
+
+def prefilter_pagelist(url: str, pagelist: list[str], pattern: str, batch_size: int, max_hits: int = SEARCH_MAX_HITS) -> list[str]:
+    # leaves out pages that can't match pattern according to the search backend.
+    # pagelist titles are compared by the title the API resolves them to (namespace aliases and capitalization,
+    # redirects), with one info request per batch. pages that don't exist are kept, so they're reported as errors
+    candidates = search_candidates(url, pattern, max_hits)
+    if candidates is None:
+        return pagelist
+    filtered_pagelist = []
+    for batch_start in range(0, len(pagelist), batch_size):
+        batch = pagelist[batch_start:batch_start + batch_size]
+        pages = get_page_info(url, list(dict.fromkeys(batch)), redirects=True)
+        for pagename in batch:
+            page, _ = pages[pagename]
+            if page['title'] in candidates or 'missing' in page or 'invalid' in page:
+                filtered_pagelist.append(pagename)
+    print(f"Search prefilter: {len(filtered_pagelist)} of {len(pagelist)} pages can match.")
+    return filtered_pagelist
+
+def prefilter_source(url: str, pagelist_source: str, pagelist_target: str, pattern: str) -> str:
+    # a search source is narrowed down by adding the insource: query to the search itself
+    if pagelist_source.lower() != "search":
+        print("Search prefilter not used: only a pagelist or the search source can be prefiltered.")
+        return pagelist_target
+    query = prefilter.insource_query(pattern)
+    if query is None:
+        print("Search prefilter not used: the condition can't be turned into a search query.")
+        return pagelist_target
+    if "CirrusSearch" not in get_extensions(url):
+        print("Search prefilter not used: the wiki doesn't have the CirrusSearch extension.")
+        return pagelist_target
+    return f"{pagelist_target} {query}"
+
+def prefetch_pages(pages, prefetch: int):
+    # fetching pages in a background thread, keeping up to "prefetch" pages ready
+    # while the pages before them are being edited and saved
+    page_queue = queue.Queue(maxsize=prefetch)
+    stop_event = threading.Event()
+
+    def put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                page_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        # always ends with a final item, so the consumer never waits for pages that won't come
+        try:
+            for item in pages:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(e)
+        else:
+            put(None)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item = page_queue.get(timeout=1)
+            except queue.Empty:
+                if not thread.is_alive() and page_queue.empty():
+                    raise Exception("Page fetching stopped unexpectedly.")
+                continue
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # waiting for the producer to stop, so it doesn't fetch (or claim from a queue) after the run ends
+        stop_event.set()
+        thread.join()
+
+def time_fetch(pages):
+    # measuring how long the edit loop waits for the content of each page
+    pages = iter(pages)
+    try:
+        while True:
+            with METRICS.timer("fetch"):
+                item = next(pages, None)
+            if item is None:
+                return
+            yield item
+    finally:
+        # closing the generator closes the one it reads from, stopping the prefetch thread
+        if hasattr(pages, 'close'):
+            pages.close()
+
+def write_metrics(report_path: str = None, prometheus_path: str = None):
+    if report_path is not None:
+        METRICS.write_report(report_path)
+        print(f"Report saved to {report_path}.")
+    if prometheus_path is not None:
+        METRICS.write_prometheus(prometheus_path)
+
+def transform_page(page_transform: PageTransform, transform_worker: TransformWorker, pagename: str, page_content: str) -> tuple[str, str]:
+    # returns the edited content (None if the page is skipped), or an error if the page went over its time budget
+    if transform_worker is not None:
+        result, stalled_rule = transform_worker.run(page_content)
+        if result is None:
+            if page_transform.profile and 0 <= stalled_rule < len(page_transform.rules):
+                (rule, pattern) = page_transform.rules[stalled_rule]
+                METRICS.record_rule(rule, pattern, transform_worker.budget, 0, pagename)
+            return None, (f"Skip filters and substitutions took longer than {transform_worker.budget} seconds, " +
+                f"stopped while applying {page_transform.describe(stalled_rule)}")
+    else:
+        result = page_transform.run(page_content)
+    (page_content_edited, phases, rule_timings) = result
+    for (phase, seconds) in phases.items():
+        METRICS.observe(phase, seconds)
+    if page_transform.profile:
+        for ((rule, pattern), timing) in zip(page_transform.rules, rule_timings):
+            if timing is not None:
+                METRICS.record_rule(rule, pattern, timing[0], timing[1], pagename)
+    return page_content_edited, None
+
+def open_journal(pagelist_path: str, resume: bool = False) -> tuple[set[str], Journal]:
+    # the outcome of each page is recorded as soon as it's known in a journal next to the pagelist.
+    # when resuming, returns the pages completed by a previous run that didn't finish, so they can be left out
+    journal_path = pagelist_path + ".journal"
+    completed = set()
+    if resume:
+        completed = {pagename for (pagename, status) in read_journal(journal_path).items() if status in COMPLETED_STATUSES}
+    return completed, Journal(journal_path, resume=resume)
+
+def add_to_pagelist(pagenames: list[str], pagelist_path: str):
+    # adds pages to a pagelist the run didn't read, keeping the pages already in it
+    utils.write_pagelist([], pagelist_path, "a")
+    index = PagelistIndex(pagelist_path)
+    utils.write_pagelist(index.add(pagenames), pagelist_path, "a")
+    index.close()
+
+def remove_completed(pagelist: list[str], completed: set[str]) -> list[str]:
+    remaining = [pagename for pagename in pagelist if pagename not in completed]
+    if len(remaining) < len(pagelist):
+        print(f"Resuming: {len(pagelist) - len(remaining)} pages already completed.")
+    return remaining
+
+def edit_pages(csrf_token: str, url: str, pagelist_path: str = None, substitution_path: str = None, append: str = None, prepend: str = None,
+skip_if: str = None, skip_ifnot: str = None, delay: int = None, summary: str = None, prefetch: int = None,
+max_rate: float = None, maxlag: int = None, cache_path: str = None, cache_size: int = 1024, resume: bool = False,
+pagelist_source: str = None, pagelist_target: str = None, namespace: str = None, limit: int = None,
+report_path: str = None, prometheus_path: str = None, search_prefilter: bool = False, queue_path: str = None, lease: float = 600,
+rule_profile: bool = False, page_timeout: float = None, conflict_retries: int = 3):
+    # pages are read from the pagelist, or listed and fetched straight from pagelist_source if it's given.
+    # in that case, pages with errors are added to the pagelist to be edited again later.
+    # with queue_path, pages are claimed from a queue shared with other processes, and results are recorded there.
+    # with search_prefilter, only pages the search backend finds skip_ifnot in are downloaded.
+    # when pages are only appended or prepended to, their content isn't downloaded at all.
+    # with rule_profile, the time and matches of each substitution and skip filter are reported at the end.
+    # with page_timeout, pages whose skip filters and substitutions take longer than that many seconds are errors.
+    # on an edit conflict, the latest revision is fetched and edited again, up to conflict_retries times
+    if substitution_path is None and append is None and prepend is None:
+        raise Exception("No modifications to be performed.")
+    set_rate_limit(max_rate=max_rate, delay=delay, maxlag=maxlag)
+    METRICS.start()
+
+    if search_prefilter and skip_ifnot is None:
+        raise Exception("The search prefilter needs a --skip-ifnot condition.")
+    substitution_list = SubstitutionList(read_substitutions(substitution_path))
+    skip_if = re.compile(skip_if) if skip_if is not None else None
+    skip_ifnot_pattern = skip_ifnot
+    skip_ifnot = re.compile(skip_ifnot) if skip_ifnot is not None else None
+    # nothing depends on the current content, so the wiki can add the text itself
+    append_only = len(substitution_list) == 0 and skip_if is None and skip_ifnot is None
+    page_transform = PageTransform(substitution_list, skip_if, skip_ifnot, append, prepend, profile=rule_profile)
+    transform_worker = TransformWorker(page_transform, page_timeout) if page_timeout is not None and not append_only else None
+
+    if queue_path is not None and pagelist_source is not None:
+        raise Exception("Pages can't be edited from a queue and a pagelist source at the same time.")
+    work_queue = None
+    journal = None
+    if queue_path is not None:
+        # the queue records results itself, and an interrupted run can be continued by running again
+        work_queue = WorkQueue(queue_path, lease=lease)
+    else:
+        completed, journal = open_journal(pagelist_path, resume)
+    batch_size = get_titles_limit(url)
+    # cache_size is given in megabytes
+    revision_cache = RevisionCache(cache_path, cache_size * 1024 * 1024) if cache_path is not None else None
+
+    if work_queue is not None:
+        pagelist = None
+        total_page_count = None
+        if search_prefilter:
+            print("Search prefilter not used: pages are claimed from the queue a batch at a time.")
+        counts = work_queue.counts()
+        print(f"Queue: {work_queue.queue_path}  {format_counts(counts)}")
+        pages = fetch_queued_pages(url, work_queue, batch_size, revision_cache, content=not append_only)
+    elif pagelist_source is not None:
+        pagelist = None
+        total_page_count = None
+        if search_prefilter:
+            pagelist_target = prefilter_source(url, pagelist_source, pagelist_target, skip_ifnot_pattern)
+        pages = generate_pages(url, pagelist_source, pagelist_target, namespace, limit, batch_size, content=not append_only)
+        if completed:
+            print(f"Resuming: {len(completed)} pages already completed will be skipped.")
+            pages = (item for item in pages if item[0] not in completed)
+    else:
+        pagelist = remove_completed(utils.read_pagelist(pagelist_path), completed)
+        if search_prefilter:
+            # pages left out can't match skip_ifnot, so they're removed from the pagelist as if they were skipped
+            pagelist = prefilter_pagelist(url, pagelist, skip_ifnot_pattern, batch_size)
+        total_page_count = len(pagelist)
+        pages = fetch_pages(url, pagelist, batch_size, revision_cache, content=not append_only)
+
     # https://www.mediawiki.org/wiki/API:Edit
     sendpage_params = {
         'action': "edit",
@@ -341,129 +1170,215 @@ skip_if: str = None, skip_ifnot: str = None, delay: int = None, summary: str = N
         'recreate': False,
         'nocreate': True,
         'watchlist': "watch",
+        'assert': "user",
         'token': csrf_token
     }
+    if append_only:
+        # only the appended and prepended text is sent, without a base revision there are no edit conflicts
+        del sendpage_params['text']
+        if append is not None:
+            sendpage_params['appendtext'] = "\n" + append
+        if prepend is not None:
+            sendpage_params['prependtext'] = prepend + "\n"
 
-    total_page_count = len(pagelist)
     page_saved_count = 0
     page_skipped_count = 0
     page_count = 0
     page_error_count = 0
     pages_with_error = []
+    # titles already handled in this run, so two redirects to the same page don't edit it twice.
+    # with a queue, titles handled by other processes are found in the queue
+    processed_titles = set()
 
     print("Editing pages...")
+    if transform_worker is not None:
+        # started before the prefetch thread exists. workers replacing one that went over budget are forked
+        # while other threads run, see TransformWorker
+        transform_worker.start()
     
+    if prefetch is not None and prefetch > 0:
+        pages = prefetch_pages(pages, prefetch)
+    pages = time_fetch(pages)
+
+    finished = False
     try:
-        for pagename in pagelist:
-            getpage_params['titles'] = pagename
-            sendpage_params['title'] = pagename
-            # navigating through redirects if redirect is found
-            while True:
-                # retry when request timeout is reached 
-                for i in range(0, 3):
-                    try:
-                        request = SESSION.get(url=url, params=getpage_params)
-                    except requests.Timeout:
-                        print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-                    else:
-                        break
-                else:
-                    page_error_count += 1
-                    pages_with_error.append((pagename, "Request reached timeout while fetching page."))
-                    print(f"\nPage: {pagename}  Status: Error - Request reached timeout while fetching page.")
-                    
-                data = request.json()
-                if 'error' in data:
-                    raise Exception(data['error'])
+        for pagename, page, curtimestamp in pages:
+            page_status = "error"
+            page_error = None
+            if 'missing' in page or 'invalid' in page:
+                page_error_count += 1
+                page_error = "Page doesn't exist."
+                pages_with_error.append((pagename, page_error))
+            elif page['title'] in processed_titles or (work_queue is not None and not work_queue.claim_target(pagename, page['title'])):
+                # redirects are resolved by the API, pages reached more than once are only edited the first time
+                page_skipped_count += 1
+                page_status = "skipped"
+            else:
+                processed_titles.add(page['title'])
+                sendpage_params['title'] = page['title']
+                skipped = False
+                if not append_only:
+                    latest_revision = page['revisions'][0]
+                    page_content = latest_revision['slots']['main']['content']
+                    page_content_edited, page_error = transform_page(page_transform, transform_worker, pagename, page_content)
+                    skipped = page_error is None and page_content_edited in (None, page_content)
 
-                if 'missing' in data['query']['pages'][0]:
+                if page_error is not None:
                     page_error_count += 1
-                    pages_with_error.append((pagename, "Page doesn't exist."))
-                    break
+                    pages_with_error.append((pagename, page_error))
+                    print(f"\nPage: {pagename}  Status: Error - {page_error}")
+                elif skipped:
+                    page_skipped_count += 1
+                    page_status = "skipped"
                 else:
-                    latest_revision = data['query']['pages'][0]['revisions'][0]
-                    page_content = latest_revision['slots']['main']['content']
+                    conflict_count = 0
+                    while True:
+                        if not append_only:
+                            sendpage_params['text'] = page_content_edited
+                            sendpage_params['starttimestamp'] = curtimestamp
+                            sendpage_params['basetimestamp'] = latest_revision['timestamp']
+                            sendpage_params['baserevid'] = latest_revision['revid']
+                            sendpage_params['contentformat'] = latest_revision['slots']['main']['contentformat']
+                            sendpage_params['contentmodel'] = latest_revision['slots']['main']['contentmodel']
 
-                    # checking if content is redirect
-                    redirect_search = re.search(r"#REDIRECT \[\[(.*?)\]\]", page_content)
-                    if bool(redirect_search):
-                        getpage_params['titles'] = redirect_search.group(1)
-                        sendpage_params['title'] = redirect_search.group(1)
+                        try:
+                            with METRICS.timer("save"):
+                                data = api_request("POST", url, sendpage_params)
+                        except Exception as e:
+                            data = {'error': {'info': str(e)}}
+                        if data.get('error', {}).get('code') != "editconflict" or conflict_count >= conflict_retries:
+                            break
+                        # the page was changed after it was fetched. the changes are applied again to the latest
+                        # revision, which may no longer need them or may now be skipped
+                        conflict_count += 1
+                        print(f"\nPage: {pagename}  Status: Edit conflict, editing the latest revision " +
+                            f"(attempt {conflict_count} of {conflict_retries})")
+                        try:
+                            with METRICS.timer("fetch"):
+                                page, curtimestamp = get_pages(url, [page['title']])[page['title']]
+                        except Exception as e:
+                            data = {'error': {'info': str(e)}}
+                            break
+                        if 'missing' in page or 'invalid' in page:
+                            data = {'error': {'info': "Page was deleted after it was fetched."}}
+                            break
+                        latest_revision = page['revisions'][0]
+                        page_content = latest_revision['slots']['main']['content']
+                        page_content_edited, page_error = transform_page(page_transform, transform_worker, pagename, page_content)
+                        if page_error is not None:
+                            data = {'error': {'info': page_error}}
+                            break
+                        if page_content_edited in (None, page_content):
+                            data = None
+                            break
+
+                    if data is None:
+                        # nothing left to change in the latest revision
+                        page_skipped_count += 1
+                        page_status = "skipped"
+                        print(f"\nPage: {pagename}  Status: Skipped after edit conflict")
+                    elif("error" in data):
+                        page_error_count += 1
+                        page_error = data['error']['info']
+                        pages_with_error.append((pagename, page_error))
+                        print(f"\nPage: {pagename}  Status: Error - {data['error']['info']}")
                     else:
-                        #if page_content contains "skip_if", skip page
-                        skip = bool(re.search(skip_if, page_content)) if skip_if is not None else False
-                        if not skip:
-                            # if page content doesn't contain "skip_ifnot", skip page
-                            skip = not bool(re.search(skip_ifnot, page_content)) if skip_ifnot is not None else False
-                            
-                        if skip:
-                            page_skipped_count += 1
-                        else:
-                            page_content_edited = page_content
-                            for substitution in substitution_list:
-                                page_content_edited = re.sub(substitution[0], substitution[1], page_content_edited)
-                            if append is not None:
-                                page_content_edited = append + "\n" + page_content_edited
-                            if prepend is not None:
-                                page_content_edited = page_content_edited + "\n" + prepend
-
-                            if page_content_edited == page_content:
-                                page_skipped_count += 1
-                            else:
-                                sendpage_params['text'] = page_content_edited
-                                sendpage_params['starttimestamp'] = data['curtimestamp']
-                                sendpage_params['basetimestamp'] = latest_revision['timestamp']
-                                sendpage_params['baserevid'] = latest_revision['revid']
-                                sendpage_params['contentformat'] = latest_revision['slots']['main']['contentformat']
-                                sendpage_params['contentmodel'] = latest_revision['slots']['main']['contentmodel']
-
-                                # retry when request timeout is reached 
-                                for i in range(0, 3):
-                                    try:
-                                        request = SESSION.post(url=url, data=sendpage_params)
-                                    except requests.Timeout:
-                                        print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-                                    else:
-                                        break
-                                else:
-                                    page_error_count += 1
-                                    pages_with_error.append((pagename, "Request reached timeout while saving page. Check your connection and try again."))
-                                    print(f"\nPage: {pagename}  Status: Error - Request reached timeout while saving page. Check your connection and try again.")
-
-                                data = request.json()
-                                if("error" in data):
-                                    page_error_count += 1
-                                    pages_with_error.append((pagename, data['error']['info']))
-                                    print(f"\nPage: {pagename}  Status: Error - {data['error']['info']}")
-                                else:
-                                    print(f"\nPage: {pagename}  Status: {data['edit']['result']}")
-                                if delay is not None:
-                                    time.sleep(delay)
-                                page_saved_count += 1
-                        #end else skip
-                        break
-                    #end else redirect_search
-                #end else missing
-            #end while
+                        print(f"\nPage: {pagename}  Status: {data['edit']['result']}")
+                        page_status = "edited"
+                        if revision_cache is not None and not append_only and 'newrevid' in data['edit']:
+                            # keeping the saved revision, so the next run doesn't download it again
+                            revision_cache.put({data['edit']['title']: {
+                                'revid': data['edit']['newrevid'],
+                                'timestamp': data['edit']['newtimestamp'],
+                                'slots': {'main': {
+                                    'contentmodel': sendpage_params['contentmodel'],
+                                    'contentformat': sendpage_params['contentformat'],
+                                    'content': page_content_edited
+                                }}
+                            }})
+                    if data is not None:
+                        page_saved_count += 1
+                #end else skip
+            #end else missing
+            if work_queue is not None:
+                if not work_queue.complete(pagename, page_status, page_error):
+                    print(f"Page: {pagename}  Warning: lease expired before the page was done, " +
+                        "it may have been handed to another process.")
+            else:
+                journal.record(pagename, page_status)
+            METRICS.record_page(page_status)
             page_count += 1
 
-            print(f"Edited: {page_saved_count}  Skipped: {page_skipped_count}  Errors: {page_error_count}  " + 
-                f"Remaining: {total_page_count - page_count}  Completed: {(page_count / len(pagelist) * 100):.2f}%")
+            if total_page_count is not None:
+                print(f"Edited: {page_saved_count}  Skipped: {page_skipped_count}  Errors: {page_error_count}  " + 
+                    f"Remaining: {total_page_count - page_count}  Completed: {(page_count / total_page_count * 100):.2f}%")
+            else:
+                print(f"Edited: {page_saved_count}  Skipped: {page_skipped_count}  Errors: {page_error_count}  " +
+                    f"Processed: {page_count}")
+        finished = True
     except KeyboardInterrupt:
         print("Execution interrupted by user input.")
     except Exception as e:
         print(f"API returned error: {e}")
+    # nothing is fetched or claimed from the queue after this point
+    pages.close()
 
-    pagelist = pagelist[page_count-1:]
+    pagelist = pagelist[page_count:] if pagelist is not None else []
     if pages_with_error:
         print("Pages with errors:")
         for (pagename, error) in pages_with_error:
             pagelist.append(pagename)
             print(f"{pagename}:  Error: {error}")
-    utils.write_pagelist(pagelist, pagelist_path, "w")
-    print("Pagelist updated successfully.")
+    if work_queue is not None:
+        # pages with errors stay in the queue with their error, pages claimed but not edited are handed out again
+        work_queue.release()
+        counts = work_queue.counts()
+        print(f"Queue: {work_queue.queue_path}  {format_counts(counts)}")
+        if counts.get("claimed", 0) > 0:
+            print(f"{counts['claimed']} pages are claimed by other processes. " +
+                "Pages of a process that was stopped are handed out again once their lease expires.")
+        work_queue.close()
+        print("Queue updated successfully.")
+    else:
+        if pagelist_source is not None:
+            # pages were listed from the source, the pagelist is only added to
+            add_to_pagelist(pagelist, pagelist_path)
+        else:
+            utils.write_pagelist(pagelist, pagelist_path, "w")
+        if pagelist_source is not None and not finished:
+            # pages not listed yet aren't known, the journal is kept so the run can be resumed from the source
+            journal.close()
+            print("Run again with --resume to skip pages already completed.")
+        else:
+            journal.remove()
+        print("Pagelist updated successfully.")
+    if revision_cache is not None:
+        revision_cache.close()
+    if transform_worker is not None:
+        transform_worker.close()
+    if rule_profile:
+        print_profile(METRICS.report()['rules'])
+    write_metrics(report_path, prometheus_path)
 
-def create_pages(csrf_token: str, url: str, pagelist_path: str, content: str, delay: int = None, summary: str = None):
+def create_page(url: str, sendpage_params: dict, pagename: str, content: str) -> dict:
+    # returns the API response, or the error raised while sending the page in the same format
+    try:
+        with METRICS.timer("save"):
+            return api_request("POST", url, {**sendpage_params, 'title': pagename, 'text': content})
+    except Exception as e:
+        return {'error': {'info': str(e)}}
+
+def create_pages(csrf_token: str, url: str, pagelist_path: str, content: str, delay: int = None, summary: str = None,
+max_rate: float = None, maxlag: int = None, resume: bool = False, report_path: str = None, prometheus_path: str = None,
+workers: int = 1, data_path: str = None, title_column: str = "title", data_format: str = None):
+    # pages that already exist are found with one query per batch of titles and left out before sending anything.
+    # the remaining pages are sent by up to "workers" threads, all sharing the same rate limit.
+    # with data_path, titles come from a CSV/JSONL file read as it goes, and content is a template filled with
+    # the fields of each row. in that case, pages with errors are added to the pagelist
+    set_rate_limit(max_rate=max_rate, delay=delay, maxlag=maxlag)
+    METRICS.start()
+    if workers > POOL_SIZE:
+        configure_http(pool_size=workers)
     # https://www.mediawiki.org/wiki/API:Edit
     sendpage_params = {
         'action': "edit",
@@ -475,59 +1390,130 @@ def create_pages(csrf_token: str, url: str, pagelist_path: str, content: str, de
         'bot': True,
         'createonly': True,
         'watchlist': "watch",
+        'assert': "user",
         'token': csrf_token
     }
 
-    pagelist = utils.read_pagelist(pagelist_path)
+    completed, journal = open_journal(pagelist_path, resume)
+    if data_path is not None:
+        template = string.Template(content)
+        datasource.check_template(template)
+        pagelist = None
+        total_page_count = None
+        pages = datasource.read_pages(data_path, title_column, data_format)
+        if completed:
+            print(f"Resuming: {len(completed)} pages already completed will be skipped.")
+            pages = (item for item in pages if item[0] not in completed)
+    else:
+        pagelist = remove_completed(utils.read_pagelist(pagelist_path), completed)
+        total_page_count = len(pagelist)
+        pages = ((pagename, None) for pagename in pagelist)
+    batch_size = get_titles_limit(url)
 
-    total_page_count = len(pagelist)
     page_saved_count = 0
+    page_skipped_count = 0
     page_count = 0
     page_error_count = 0
     pages_with_error = []
+    # pages with an outcome in this run, to update the pagelist at the end
+    finished = set()
+    # titles already sent, so repeated titles are only created once. kept on disk, since data files can have millions of rows
+    submitted_titles = PagelistIndex()
+
+    def record(pagename: str, status: str, message: str = None):
+        nonlocal page_saved_count, page_skipped_count, page_count, page_error_count
+        if status == "error":
+            page_error_count += 1
+            pages_with_error.append((pagename, message))
+            print(f"\nPage: {pagename}  Status: Error - {message}")
+        elif status == "skipped":
+            page_skipped_count += 1
+        else:
+            page_saved_count += 1
+            print(f"\nPage: {pagename}  Status: {message}")
+        journal.record(pagename, status)
+        METRICS.record_page(status)
+        page_count += 1
+        if pagelist is not None:
+            finished.add(pagename)
+            print(f"Created: {page_saved_count}  Skipped: {page_skipped_count}  Errors: {page_error_count}  " +
+                f"Remaining: {total_page_count - page_count}  Completed: {(page_count / total_page_count * 100):.2f}%")
+        else:
+            print(f"Created: {page_saved_count}  Skipped: {page_skipped_count}  Errors: {page_error_count}  " +
+                f"Processed: {page_count}")
+
+    def record_result(future, pagename: str):
+        data = future.result()
+        if 'error' in data:
+            record(pagename, "error", data['error']['info'])
+        else:
+            record(pagename, "created", data['edit']['result'])
 
     print("Creating pages...")
 
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+    finished_reading = False
     try:
-        for pagename in pagelist:
-            sendpage_params['title'] = pagename
-            sendpage_params['text'] = content
-
-            # retry when request timeout is reached 
-            for i in range(0, 3):
+        while True:
+            batch = list(itertools.islice(pages, batch_size))
+            if not batch:
+                break
+            # https://www.mediawiki.org/wiki/API:Info
+            page_info = get_page_info(url, list(dict.fromkeys(pagename for (pagename, _) in batch)))
+            new_titles = set(submitted_titles.add([page['title'] for (page, _) in page_info.values() if 'missing' in page]))
+            for (pagename, fields) in batch:
+                page, _ = page_info[pagename]
+                if 'invalid' in page:
+                    record(pagename, "error", page.get('invalidreason', "Invalid title."))
+                    continue
+                elif 'missing' not in page or page['title'] not in new_titles:
+                    record(pagename, "skipped")
+                    continue
+                new_titles.remove(page['title'])
                 try:
-                    request = SESSION.post(url=url, data=sendpage_params)
-                except requests.Timeout:
-                    print(f"Connection with API failed. Retrying. ({i+1} of 3)")
-                else:
-                    break
-            else:
-                page_error_count += 1
-                pages_with_error.append((pagename, "Request reached timeout while saving page. Check your connection and try again."))
-                print(f"\nPage: {pagename}  Status: Error - Request reached timeout while saving page. Check your connection and try again.")
-                
-            data = request.json()
-            if 'error' in data:
-                page_error_count += 1
-                pages_with_error.append((pagename, data['error']['info']))
-                print(f"\nPage: {pagename}  Status: Error - {data['error']['info']}")
-            else:
-                print(f"\nPage: {pagename}  Status: {data['edit']['result']}")
-                page_saved_count += 1
-            if delay is not None:
-                time.sleep(delay)
-            page_count += 1
-            print(f"Created: {page_saved_count}  Errors: {page_error_count}  " + 
-                f"Remaining: {total_page_count - page_count}  Completed: {(page_count / len(pagelist) * 100):.2f}%")
+                    page_content = datasource.render_content(template, fields) if fields is not None else content
+                except Exception as e:
+                    record(pagename, "error", str(e))
+                    continue
+                futures[executor.submit(create_page, url, sendpage_params, page['title'], page_content)] = pagename
+                # keeping a bounded number of pages queued, so the existence check doesn't run far ahead
+                while len(futures) >= workers * 2:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record_result(future, futures.pop(future))
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                record_result(future, futures.pop(future))
+        finished_reading = True
     except KeyboardInterrupt:
         print("Execution interrupted by user input.")
     except Exception as e:
         print(f"API returned error: {e}")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        # pages sent before the interruption are still recorded
+        for (future, pagename) in futures.items():
+            if future.done() and not future.cancelled():
+                record_result(future, pagename)
+        submitted_titles.close()
 
-    pagelist = pagelist[page_count-1:]
+    pagelist = [pagename for pagename in pagelist if pagename not in finished] if pagelist is not None else []
     if pages_with_error:
         print("Pages with errors:")
         for (pagename, error) in pages_with_error:
             pagelist.append(pagename)
             print(f"{pagename}:  Error: {error}")
-    utils.write_pagelist(pagelist, pagelist_path, "w")
\ No newline at end of file
+    if data_path is not None:
+        # pages were read from the data file, the pagelist is only added to
+        add_to_pagelist(pagelist, pagelist_path)
+    else:
+        utils.write_pagelist(pagelist, pagelist_path, "w")
+    if data_path is not None and not finished_reading:
+        # rows not read yet aren't in the pagelist, the journal is kept so the run can be resumed from the data file
+        journal.close()
+        print("Run again with --resume to skip pages already completed.")
+    else:
+        journal.remove()
+    write_metrics(report_path, prometheus_path)
@@ -0,0 +1,171 @@
+# standard library imports
+import contextlib
+import threading
+import time
+# custom modules
+import lib.utils as utils
+
+# upper bounds in seconds of the histogram buckets, the last bucket takes everything above them
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROMETHEUS_PREFIX = "mediawiki_pybot"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for (i, bound) in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        # bucket counts as reported by Prometheus, each including every smaller bucket
+        cumulative = []
+        count = 0
+        for (bound, bucket_count) in zip([str(bound) for bound in BUCKETS] + ["+Inf"], self.counts):
+            count += bucket_count
+            cumulative.append((bound, count))
+        return cumulative
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0,
+            'max': round(self.max, 6),
+            'buckets': dict(self.cumulative_counts())
+        }
+
+class Metrics:
+    # Counters and latency histograms for a run, shared by every thread.
+    # Phases: fetch (waiting for page content), skip (skip filters), substitution, save (edit requests)
+    # and sleep (waiting for the rate limiter or for a retry). Time spent sleeping inside another
+    # phase is only counted as sleep, so phases add up to the time the run actually spent in them.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start()
+
+    def start(self):
+        with self.lock:
+            self.started = time.time()
+            self.phases = {}
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.errors = {}
+            self.pages = {}
+            # per substitution and skip filter, when profiling
+            self.rules = {}
+
+    def slept(self) -> float:
+        return getattr(self.local, 'slept', 0.0)
+
+    @contextlib.contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        slept_before = self.slept()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if phase == "sleep":
+                self.local.slept = self.slept() + elapsed
+            else:
+                elapsed = max(0.0, elapsed - (self.slept() - slept_before))
+            self.observe(phase, elapsed)
+
+    def observe(self, phase: str, seconds: float):
+        with self.lock:
+            self.phases.setdefault(phase, Histogram()).observe(seconds)
+
+    def record_request(self, bytes_sent: int, bytes_received: int):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+    def record_error(self, code: str):
+        with self.lock:
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def record_page(self, status: str):
+        with self.lock:
+            self.pages[status] = self.pages.get(status, 0) + 1
+
+    def record_rule(self, rule: str, pattern: str, seconds: float, match_count: int, pagename: str):
+        with self.lock:
+            stats = self.rules.setdefault(rule, {'pattern': pattern, 'pages': 0, 'seconds': 0.0, 'matches': 0,
+                'worst_page': None, 'worst_seconds': 0.0})
+            stats['pages'] += 1
+            stats['seconds'] += seconds
+            stats['matches'] += match_count
+            if stats['worst_page'] is None or seconds > stats['worst_seconds']:
+                stats['worst_page'] = pagename
+                stats['worst_seconds'] = seconds
+
+    def report(self) -> dict:
+        with self.lock:
+            duration = time.time() - self.started
+            return {
+                'started': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+                'duration': round(duration, 3),
+                'requests': self.requests,
+                'requests_per_second': round(self.requests / duration, 3) if duration > 0 else 0,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'pages': dict(self.pages),
+                'errors': dict(self.errors),
+                'rules': {rule: {**stats, 'seconds': round(stats['seconds'], 6), 'worst_seconds': round(stats['worst_seconds'], 6)}
+                    for (rule, stats) in self.rules.items()},
+                'phases': {phase: histogram.to_dict() for (phase, histogram) in self.phases.items()}
+            }
+
+    def write_report(self, report_path: str):
+        utils.write_json(report_path, self.report())
+
+    def write_prometheus(self, textfile_path: str):
+        # https://prometheus.io/docs/instrumenting/exposition_formats/
+        # written for the node_exporter textfile collector, which needs the file to be replaced atomically
+        report = self.report()
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_phase_seconds Time spent in each phase of the run.",
+            f"# TYPE {PROMETHEUS_PREFIX}_phase_seconds histogram"
+        ]
+        with self.lock:
+            for (phase, histogram) in self.phases.items():
+                for (bound, count) in histogram.cumulative_counts():
+                    lines.append(f'{PROMETHEUS_PREFIX}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+                lines.append(f'{PROMETHEUS_PREFIX}_phase_seconds_sum{{phase="{phase}"}} {histogram.total}')
+                lines.append(f'{PROMETHEUS_PREFIX}_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        lines += [
+            f"# TYPE {PROMETHEUS_PREFIX}_requests_total counter",
+            f"{PROMETHEUS_PREFIX}_requests_total {report['requests']}",
+            f"# TYPE {PROMETHEUS_PREFIX}_requests_per_second gauge",
+            f"{PROMETHEUS_PREFIX}_requests_per_second {report['requests_per_second']}",
+            f"# TYPE {PROMETHEUS_PREFIX}_bytes_total counter",
+            f'{PROMETHEUS_PREFIX}_bytes_total{{direction="sent"}} {report["bytes_sent"]}',
+            f'{PROMETHEUS_PREFIX}_bytes_total{{direction="received"}} {report["bytes_received"]}',
+            f"# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge",
+            f"{PROMETHEUS_PREFIX}_run_duration_seconds {report['duration']}",
+            f"# TYPE {PROMETHEUS_PREFIX}_api_errors_total counter"
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_api_errors_total{{code="{code}"}} {count}' for (code, count) in report['errors'].items()]
+        if report['rules']:
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_rule_seconds_total counter")
+            lines += [f'{PROMETHEUS_PREFIX}_rule_seconds_total{{rule="{rule}"}} {stats["seconds"]}' for (rule, stats) in report['rules'].items()]
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_rule_matches_total counter")
+            lines += [f'{PROMETHEUS_PREFIX}_rule_matches_total{{rule="{rule}"}} {stats["matches"]}' for (rule, stats) in report['rules'].items()]
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_pages_total counter")
+        lines += [f'{PROMETHEUS_PREFIX}_pages_total{{status="{status}"}} {count}' for (status, count) in report['pages'].items()]
+        utils.write_text(textfile_path, "\n".join(lines) + "\n")
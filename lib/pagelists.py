@@ -0,0 +1,120 @@
+# standard library imports
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+
+# number of titles read from a pagelist and looked up in an index at a time
+BATCH_SIZE = 500
+SEPARATOR_PATTERN = re.compile(r"[_\s]+")
+
+def normalize_title(pagename: str) -> str:
+    # https://www.mediawiki.org/wiki/Manual:Page_title
+    # underscores and spaces are the same character in titles, and the first letter is case-insensitive
+    pagename = SEPARATOR_PATTERN.sub(" ", pagename).strip()
+    return pagename[:1].upper() + pagename[1:]
+
+def title_hash(pagename: str) -> int:
+    # 64-bit hash of the normalized title, used as key in the on-disk index
+    digest = hashlib.blake2b(normalize_title(pagename).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def read_pagelist_batches(pagelist_path: str):
+    # yields the pagelist in batches, without loading the whole file in memory
+    batch = []
+    if pagelist_path is not None and os.path.exists(pagelist_path):
+        with open(pagelist_path) as pagelist_file:
+            for line in pagelist_file:
+                pagename = line.rstrip("\n")
+                if pagename.strip() != "":
+                    batch.append(pagename)
+                if len(batch) >= BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+class PagelistIndex:
+    # On-disk set of titles, compared by their normalized form.
+    # Titles are stored as 64-bit hashes in a temporary SQLite table, so pagelists with
+    # millions of titles can be deduplicated and combined without holding them in memory.
+
+    def __init__(self, pagelist_path: str = None):
+        self.index_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+        self.index_file.close()
+        self.connection = sqlite3.connect(self.index_file.name)
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute("CREATE TABLE titles (hash INTEGER PRIMARY KEY)")
+        for batch in read_pagelist_batches(pagelist_path):
+            self.add(batch)
+
+    def find_hashes(self, hashes: list[int]) -> set[int]:
+        found = set()
+        for start in range(0, len(hashes), BATCH_SIZE):
+            chunk = hashes[start:start + BATCH_SIZE]
+            found.update(row[0] for row in self.connection.execute(
+                f"SELECT hash FROM titles WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def contains(self, pagenames: list[str]) -> list[bool]:
+        hashes = [title_hash(pagename) for pagename in pagenames]
+        found = self.find_hashes(hashes)
+        return [pagename_hash in found for pagename_hash in hashes]
+
+    def add(self, pagenames: list[str]) -> list[str]:
+        # adds titles to the index, returning the ones that weren't in it yet in their original order
+        hashes = [title_hash(pagename) for pagename in pagenames]
+        found = self.find_hashes(hashes)
+        added = []
+        added_hashes = []
+        for (pagename, pagename_hash) in zip(pagenames, hashes):
+            if pagename_hash not in found:
+                added.append(pagename)
+                added_hashes.append((pagename_hash,))
+                found.add(pagename_hash)
+        self.connection.executemany("INSERT INTO titles VALUES (?)", added_hashes)
+        self.connection.commit()
+        return added
+
+    def close(self):
+        self.connection.close()
+        os.remove(self.index_file.name)
+
+def combine_pagelists(operation: str, input_paths: list[str], output_path: str) -> int:
+    # dedup: removes repeated titles from a pagelist, keeping the first occurrence
+    # union: titles present in any of the pagelists
+    # intersection: titles of the first pagelist present in all other pagelists
+    # difference: titles of the first pagelist not present in any other pagelist
+    for input_path in input_paths:
+        if not os.path.exists(input_path):
+            raise Exception(f"Pagelist not found: {input_path}")
+    if operation in ("intersection", "difference") and len(input_paths) < 2:
+        raise Exception(f"At least two pagelists are needed for {operation}.")
+
+    others = [PagelistIndex(input_path) for input_path in input_paths[1:]] if operation in ("intersection", "difference") else []
+    sources = input_paths if operation in ("union", "dedup") else input_paths[:1]
+    written = PagelistIndex()
+    page_count = 0
+
+    # the output is written to a temporary file first, since it may also be one of the inputs
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    try:
+        with open(output_path + ".tmp", "w") as output_file:
+            for source_path in sources:
+                for batch in read_pagelist_batches(source_path):
+                    if operation == "intersection":
+                        found = [other.contains(batch) for other in others]
+                        batch = [pagename for (i, pagename) in enumerate(batch) if all(other[i] for other in found)]
+                    elif operation == "difference":
+                        found = [other.contains(batch) for other in others]
+                        batch = [pagename for (i, pagename) in enumerate(batch) if not any(other[i] for other in found)]
+                    for pagename in written.add(batch):
+                        output_file.write("{}\n".format(normalize_title(pagename)))
+                        page_count += 1
+        os.replace(output_path + ".tmp", output_path)
+    finally:
+        for index in others + [written]:
+            index.close()
+    return page_count
@@ -0,0 +1,90 @@
+# standard library imports
+import re
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # python < 3.11
+    import sre_parse
+
+# https://www.mediawiki.org/wiki/Help:CirrusSearch#Regular_expression_searches
+# characters with a special meaning in the regex syntax used by insource:/.../
+RESERVED_CHARS = set('.?+*|{}[]()"\\#@&<>~/^$')
+
+def escape_char(char: str) -> str:
+    return "\\" + char if char in RESERVED_CHARS else char
+
+def class_regex(items: list, ascii: bool = False) -> str:
+    # character class, e.g. [^a-z0-9]
+    parts = []
+    for (op, value) in items:
+        if op is sre_parse.NEGATE:
+            parts.insert(0, "^")
+        elif op is sre_parse.LITERAL:
+            parts.append(escape_char(chr(value)) if chr(value) not in "]-" else "\\" + chr(value))
+        elif op is sre_parse.RANGE:
+            parts.append(escape_char(chr(value[0])) + "-" + escape_char(chr(value[1])))
+        elif op is sre_parse.CATEGORY and value is sre_parse.CATEGORY_DIGIT and ascii:
+            # without re.ASCII, \d also matches digits of other scripts, which 0-9 would leave out
+            parts.append("0-9")
+        else:
+            return None
+    return "[" + "".join(parts) + "]"
+
+def lucene_regex(parsed, ascii: bool = False) -> str:
+    # rewrites a parsed python regex in the syntax of insource:/.../, or returns None if it uses features
+    # that can't be rewritten. the result can match more than the original (e.g. anchors are dropped),
+    # never less, since pages it leaves out are not downloaded at all
+    regex = ""
+    for (op, value) in parsed:
+        if op is sre_parse.LITERAL:
+            regex += escape_char(chr(value))
+        elif op is sre_parse.ANY:
+            regex += "."
+        elif op is sre_parse.IN:
+            char_class = class_regex(value, ascii)
+            if char_class is None:
+                return None
+            regex += char_class
+        elif op is sre_parse.AT:
+            # anchors only narrow matches down
+            continue
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            (min_count, max_count, item) = value
+            item_regex = lucene_regex(item, ascii)
+            if item_regex is None:
+                return None
+            if len(item) != 1 or item[0][0] in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                item_regex = "(" + item_regex + ")"
+            if max_count is sre_parse.MAXREPEAT:
+                repeat = {0: "*", 1: "+"}.get(min_count, "{%d,}" % min_count)
+            elif (min_count, max_count) == (0, 1):
+                repeat = "?"
+            else:
+                repeat = "{%d,%d}" % (min_count, max_count)
+            regex += item_regex + repeat
+        elif op is sre_parse.BRANCH:
+            alternatives = [lucene_regex(alternative, ascii) for alternative in value[1]]
+            if None in alternatives:
+                return None
+            regex += "(" + "|".join(alternatives) + ")"
+        elif op is sre_parse.SUBPATTERN:
+            (_, add_flags, del_flags, item) = value
+            item_regex = lucene_regex(item, ascii)
+            if item_regex is None or add_flags or del_flags:
+                return None
+            regex += "(" + item_regex + ")"
+        else:
+            return None
+    return regex
+
+def insource_query(pattern: str) -> str:
+    # returns a search query for pages whose source can match pattern, or None if there's no equivalent query
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    regex = lucene_regex(parsed, bool(parsed.state.flags & re.ASCII))
+    # an empty regex would match every page
+    if regex is None or regex.strip("().*?") == "":
+        return None
+    return "insource:/" + regex + "/" + ("i" if parsed.state.flags & re.IGNORECASE else "")
@@ -0,0 +1,72 @@
+# standard library imports
+import threading
+import time
+
+class RateLimiter:
+    # Shared rate control for all API requests.
+    # Edits are spaced by an interval that starts at the configured ceiling (edits per minute),
+    # grows when the wiki reports rate limiting or answers an edit with lag, and shrinks back after successful edits.
+    # Pauses requested by the server (maxlag, Retry-After) hold every request, not only edits.
+
+    MAX_INTERVAL = 300
+    # longest pause of all requests while the servers are lagged
+    MAX_PAUSE = 60
+    BACKOFF_FACTOR = 2
+    RECOVERY_FACTOR = 0.8
+
+    def __init__(self, max_rate: float = None, maxlag: int = 5):
+        self.lock = threading.Lock()
+        self.maxlag = maxlag
+        self.min_interval = 0
+        self.interval = 0
+        self.last_edit = 0
+        self.paused_until = 0
+        self.configure(max_rate=max_rate, maxlag=maxlag)
+
+    def configure(self, max_rate: float = None, maxlag: int = None):
+        with self.lock:
+            self.min_interval = 60 / max_rate if max_rate is not None and max_rate > 0 else 0
+            self.interval = self.min_interval
+            if maxlag is not None:
+                self.maxlag = maxlag
+
+    def wait(self):
+        # holding requests while the server asked for a pause
+        while True:
+            with self.lock:
+                remaining = self.paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def wait_edit(self):
+        self.wait()
+        while True:
+            with self.lock:
+                remaining = self.last_edit + self.interval - time.monotonic()
+                if remaining <= 0:
+                    self.last_edit = time.monotonic()
+                    return
+            time.sleep(remaining)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def lag(self, seconds: float):
+        self.pause(seconds)
+        print(f"Server is lagged. Holding requests for {seconds:.1f} seconds.")
+
+    def backoff(self, retry_after: float = None):
+        with self.lock:
+            self.interval = min(self.MAX_INTERVAL, max(self.interval * self.BACKOFF_FACTOR, retry_after or 0, 1))
+            self.paused_until = max(self.paused_until, time.monotonic() + (retry_after or self.interval))
+        print(f"Server is busy. Slowing down to one edit every {self.interval:.1f} seconds.")
+
+    def success(self):
+        # ramping back up to the configured ceiling after successful edits
+        with self.lock:
+            if self.interval > self.min_interval:
+                self.interval = self.interval * self.RECOVERY_FACTOR
+                if self.interval < max(self.min_interval, 0.05):
+                    self.interval = self.min_interval
@@ -0,0 +1,82 @@
+# standard library imports
+import os
+import sqlite3
+import threading
+import time
+
+class RevisionCache:
+    # On-disk cache of page content, keyed by title and revision id.
+    # Only the latest known revision of each title is kept. When the total size of cached
+    # content goes over max_size (in bytes), the least recently used pages are evicted.
+
+    def __init__(self, cache_path: str, max_size: int):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # the cache is shared with the prefetch thread, access is serialized by self.lock
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS revisions (
+                title TEXT PRIMARY KEY,
+                revid INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                contentmodel TEXT,
+                contentformat TEXT,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS revisions_last_used ON revisions (last_used)")
+        self.connection.commit()
+
+    def get(self, revisions: dict) -> dict:
+        # revisions: {title: revid}
+        # returns {title: revision} for cached titles, with revision in the format returned by API:Revisions
+        found = {}
+        now = time.time()
+        with self.lock:
+            for (title, revid) in revisions.items():
+                row = self.connection.execute(
+                    "SELECT revid, timestamp, contentmodel, contentformat, content FROM revisions WHERE title = ? AND revid = ?",
+                    (title, revid)).fetchone()
+                if row is not None:
+                    found[title] = {
+                        'revid': row[0],
+                        'timestamp': row[1],
+                        'slots': {'main': {'contentmodel': row[2], 'contentformat': row[3], 'content': row[4]}}
+                    }
+            self.connection.executemany("UPDATE revisions SET last_used = ? WHERE title = ?",
+                [(now, title) for title in found])
+            self.connection.commit()
+        return found
+
+    def put(self, revisions: dict):
+        # revisions: {title: revision}, with revision in the format returned by API:Revisions
+        now = time.time()
+        rows = []
+        for (title, revision) in revisions.items():
+            main_slot = revision['slots']['main']
+            rows.append((title, revision['revid'], revision['timestamp'], main_slot.get('contentmodel'),
+                main_slot.get('contentformat'), main_slot['content'], len(main_slot['content'].encode()), now))
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM revisions").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        # removing least recently used pages until the cache fits its size cap
+        removed = []
+        for (title, size) in self.connection.execute("SELECT title, size FROM revisions ORDER BY last_used"):
+            if total_size <= self.max_size:
+                break
+            removed.append((title,))
+            total_size -= size
+        self.connection.executemany("DELETE FROM revisions WHERE title = ?", removed)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
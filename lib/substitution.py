@@ -0,0 +1,121 @@
+# standard library imports
+import os
+import re
+import time
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # python < 3.11
+    import sre_parse
+
+def read_substitutions(substitution_path: str) -> list[tuple[str, str]]:
+    # See substitution_example.txt for the file format
+    substitutions = []
+    if substitution_path is not None and os.path.exists(substitution_path):
+        with open(substitution_path) as substitution_file:
+            for line in substitution_file:
+                match = re.search(r'^"(.*)" "(.*)"', line)
+                if match:
+                    substitutions.append((match.group(1), match.group(2)))
+    return substitutions
+
+def literal_pattern(pattern: str) -> str:
+    # returns the plain text matched by a pattern without any regex features
+    # (e.g. "\[\[Category:Testing\]\]"), or None if the pattern is a real regex
+    if pattern == "":
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    if parsed.state.flags & ~int(re.UNICODE):
+        return None
+    if any(op is not sre_parse.LITERAL for op, _ in parsed):
+        return None
+    return "".join(chr(char) for _, char in parsed)
+
+def overlaps(a: str, b: str) -> bool:
+    # True if an occurrence of a and an occurrence of b can share characters in some text
+    if a in b or b in a:
+        return True
+    for size in range(1, min(len(a), len(b))):
+        if a.endswith(b[:size]) or b.endswith(a[:size]):
+            return True
+    return False
+
+def trie_pattern(node: dict) -> str:
+    # builds a regex from a trie of literals so candidates sharing a prefix are matched together
+    pattern = ""
+    while len(node) == 1 and "" not in node:
+        (char, node), = node.items()
+        pattern += re.escape(char)
+    if "" in node:
+        return pattern
+    return pattern + "(?:" + "|".join(re.escape(char) + trie_pattern(child) for char, child in sorted(node.items())) + ")"
+
+class SubstitutionList:
+    # Applies a list of (pattern, replacement) substitutions with the same result as calling
+    # re.sub for each substitution in order, compiling every pattern only once.
+    # Consecutive literal substitutions that can't affect each other's matches are merged
+    # into a single pass over the text.
+
+    def __init__(self, substitutions: list[tuple[str, str]]):
+        self.substitutions = substitutions
+        self.steps = []
+        # every substitution compiled on its own, only used when applying them one at a time
+        self.patterns = None
+
+        group = []
+        for (pattern, replacement) in substitutions:
+            literal = literal_pattern(pattern)
+            if literal is None or "\\" in replacement:
+                self.add_literal_group(group)
+                group = []
+                self.steps.append((re.compile(pattern), replacement))
+                continue
+            # a later literal can only share the pass if no earlier match or replacement can overlap it
+            if any(overlaps(earlier, literal) or overlaps(earlier_replacement, literal)
+                for earlier, earlier_replacement in group):
+                self.add_literal_group(group)
+                group = []
+            group.append((literal, replacement))
+        self.add_literal_group(group)
+
+    def add_literal_group(self, group: list[tuple[str, str]]):
+        if len(group) == 1:
+            self.steps.append(group[0])
+        elif len(group) > 1:
+            trie = {}
+            for (literal, _) in group:
+                node = trie
+                for char in literal:
+                    node = node.setdefault(char, {})
+                node[""] = {}
+            self.steps.append((re.compile(trie_pattern(trie)), dict(group)))
+
+    def __len__(self) -> int:
+        return len(self.substitutions)
+
+    def apply(self, text: str) -> str:
+        for (pattern, replacement) in self.steps:
+            if isinstance(pattern, str):
+                text = text.replace(pattern, replacement)
+            elif isinstance(replacement, dict):
+                text = pattern.sub(lambda match: replacement[match.group()], text)
+            else:
+                text = pattern.sub(replacement, text)
+        return text
+
+    def apply_each(self, text: str, progress=None) -> tuple[str, list[tuple[float, int]]]:
+        # applies the substitutions one at a time, with the same result as apply, returning the time taken
+        # and number of matches of each. progress.value is set to the index of the substitution being applied
+        if self.patterns is None:
+            self.patterns = [(re.compile(pattern), replacement) for (pattern, replacement) in self.substitutions]
+        timings = []
+        for (index, (pattern, replacement)) in enumerate(self.patterns):
+            if progress is not None:
+                progress.value = index
+            start = time.perf_counter()
+            text, match_count = pattern.subn(replacement, text)
+            timings.append((time.perf_counter() - start, match_count))
+        return text, timings
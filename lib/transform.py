@@ -0,0 +1,152 @@
+# standard library imports
+import multiprocessing
+import os
+import re
+import signal
+import time
+# custom modules
+from lib.substitution import SubstitutionList
+
+# progress value while the substitutions are applied together, without profiling
+SUBSTITUTIONS = -1
+
+class PageTransform:
+    # Skip filters, substitutions and appended/prepended text applied to the content of a page.
+    # With profile, substitutions are applied one at a time, measuring each of them and the skip filters.
+    # Rules are numbered substitutions first, then skip-if and skip-ifnot.
+
+    def __init__(self, substitution_list: SubstitutionList, skip_if: re.Pattern = None, skip_ifnot: re.Pattern = None,
+    append: str = None, prepend: str = None, profile: bool = False):
+        self.substitution_list = substitution_list
+        self.skip_if = skip_if
+        self.skip_ifnot = skip_ifnot
+        self.append = append
+        self.prepend = prepend
+        self.profile = profile
+        # (name, pattern) of each rule
+        self.rules = [(f"substitution {number}", pattern)
+            for (number, (pattern, _)) in enumerate(substitution_list.substitutions, start=1)]
+        self.rules.append(("skip-if", skip_if.pattern if skip_if is not None else None))
+        self.rules.append(("skip-ifnot", skip_ifnot.pattern if skip_ifnot is not None else None))
+
+    def describe(self, index: int) -> str:
+        if index == SUBSTITUTIONS or not 0 <= index < len(self.rules):
+            return "the substitutions (use --rule-profile to find which one)"
+        (name, pattern) = self.rules[index]
+        return f"{name}: {pattern}"
+
+    def run(self, page_content: str, progress=None) -> tuple[str, dict, list]:
+        # returns the edited content (None if the page is skipped), the seconds spent in the skip and substitution
+        # phases, and the (seconds, matches) of each rule applied. progress.value is set to the rule being applied
+        rule_timings = [None] * len(self.rules)
+        start = time.perf_counter()
+        skipped = False
+        # pages matching skip-if, or not matching skip-ifnot, are skipped
+        for (index, pattern, skip_on_match) in ((len(self.rules) - 2, self.skip_if, True), (len(self.rules) - 1, self.skip_ifnot, False)):
+            if pattern is None or skipped:
+                continue
+            if progress is not None:
+                progress.value = index
+            rule_start = time.perf_counter()
+            matched = pattern.search(page_content) is not None
+            rule_timings[index] = (time.perf_counter() - rule_start, int(matched))
+            skipped = matched == skip_on_match
+        phases = {'skip': time.perf_counter() - start}
+        if skipped:
+            return None, phases, rule_timings
+
+        start = time.perf_counter()
+        if self.profile:
+            page_content_edited, timings = self.substitution_list.apply_each(page_content, progress)
+            rule_timings[:len(timings)] = timings
+        else:
+            if progress is not None:
+                progress.value = SUBSTITUTIONS
+            page_content_edited = self.substitution_list.apply(page_content)
+        if self.append is not None:
+            page_content_edited = page_content_edited + "\n" + self.append
+        if self.prepend is not None:
+            page_content_edited = self.prepend + "\n" + page_content_edited
+        phases['substitution'] = time.perf_counter() - start
+        return page_content_edited, phases, rule_timings
+
+def serve_transforms(page_transform: PageTransform, connection, progress):
+    # runs in the worker process, transforming each page sent until the connection is closed.
+    # Ctrl+C is handled by the main process, which then stops this one
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            page_content = connection.recv()
+        except EOFError:
+            # leaving without flushing output or running exit handlers, which may need locks
+            # held by other threads of the main process when it was forked
+            os._exit(0)
+        try:
+            connection.send((True, page_transform.run(page_content, progress)))
+        except Exception as e:
+            connection.send((False, str(e)))
+
+class TransformWorker:
+    # Runs a PageTransform in a separate process with a time budget for each page.
+    # A regex stuck in catastrophic backtracking can't be interrupted, so when a page goes over budget
+    # the process is killed, and a new one is started for the next page.
+    # The process is forked, and replacements are forked while the prefetch, HTTP and queue threads are running
+    # (under serve, always). Only the calling thread is copied, so locks held by the others stay locked in the
+    # new process: it only uses the pipe, the shared progress value and the re module, which take none of them.
+    # spawn and forkserver can't be used, since they import the main script again, which runs its command.
+
+    def __init__(self, page_transform: PageTransform, budget: float):
+        self.page_transform = page_transform
+        self.budget = budget
+        # fork keeps the compiled patterns, so nothing has to be sent to the process but the pages
+        self.context = multiprocessing.get_context("fork")
+        # index of the rule being applied, readable after the process is killed
+        self.progress = self.context.Value('i', SUBSTITUTIONS, lock=False)
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        self.connection, worker_connection = self.context.Pipe()
+        self.process = self.context.Process(target=serve_transforms,
+            args=(self.page_transform, worker_connection, self.progress), daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+    def close(self):
+        # the process holds no state, so it's killed even if it's in the middle of a page
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.process = None
+
+    def run(self, page_content: str) -> tuple[tuple, int]:
+        # returns the result of PageTransform.run, or None and the index of the rule that was being applied
+        # if the page went over budget
+        if self.process is None:
+            self.start()
+        self.connection.send(page_content)
+        if not self.connection.poll(self.budget):
+            rule = self.progress.value
+            self.close()
+            return None, rule
+        try:
+            (success, result) = self.connection.recv()
+        except EOFError:
+            self.close()
+            raise Exception("The process applying substitutions stopped unexpectedly.")
+        if not success:
+            raise Exception(result)
+        return result, None
+
+def print_profile(rules: dict):
+    # rules as in the metrics report, slowest first
+    if not rules:
+        return
+    print("Rule profile:")
+    print(f"{'rule':<18}{'seconds':>10}{'pages':>8}{'matches':>9}  worst page")
+    for (rule, stats) in sorted(rules.items(), key=lambda item: item[1]['seconds'], reverse=True):
+        print(f"{rule:<18}{stats['seconds']:>10.3f}{stats['pages']:>8}{stats['matches']:>9}  " +
+            f"{stats['worst_page']} ({stats['worst_seconds']:.3f}s)")
+    for (rule, stats) in rules.items():
+        print(f"{rule}: {stats['pattern']}")
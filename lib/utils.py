@@ -9,10 +9,36 @@ def read_pagelist(pagelist_path: str) -> list[str]:
     return pagelist
 
 def write_pagelist(pagelist: list[str], pagelist_path: str, pagelist_mode: str):
-    os.makedirs(os.path.dirname(pagelist_path), exist_ok=True)
-    with open(pagelist_path, pagelist_mode) as pagelist_file:
+    # a pagelist being replaced is written to a temporary file first, so a crash never leaves it partially written
+    os.makedirs(os.path.dirname(os.path.abspath(pagelist_path)), exist_ok=True)
+    output_path = pagelist_path + ".tmp" if pagelist_mode == "w" else pagelist_path
+    with open(output_path, pagelist_mode) as pagelist_file:
         for pagename in pagelist:
             pagelist_file.write("{}\n".format(pagename))
+    if pagelist_mode == "w":
+        os.replace(output_path, pagelist_path)
+
+def read_json(json_path: str) -> dict:
+    if os.path.exists(json_path):
+        with open(json_path) as json_file:
+            return json.load(json_file)
+    return None
+
+def write_json(json_path: str, data: dict, private: bool = False):
+    # writing to a temporary file first, so a crash never leaves a partially written file.
+    # private files (e.g. session cookies) are only readable by the current user
+    os.makedirs(os.path.dirname(os.path.abspath(json_path)), exist_ok=True)
+    with open(json_path + ".tmp", "w") as json_file:
+        if private:
+            os.chmod(json_path + ".tmp", 0o600)
+        json.dump(data, json_file)
+    os.replace(json_path + ".tmp", json_path)
+
+def write_text(text_path: str, text: str):
+    os.makedirs(os.path.dirname(os.path.abspath(text_path)), exist_ok=True)
+    with open(text_path + ".tmp", "w") as text_file:
+        text_file.write(text)
+    os.replace(text_path + ".tmp", text_path)
 
 def read_credentials(credentials_path: str) -> dict:
     if os.path.exists(credentials_path):
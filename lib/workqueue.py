@@ -0,0 +1,165 @@
+# standard library imports
+import os
+import socket
+import sqlite3
+import threading
+import time
+# custom modules
+from lib.pagelists import normalize_title, read_pagelist_batches
+
+# statuses of pages that are not handed out again
+DONE_STATUSES = ("edited", "skipped")
+
+class WorkQueue:
+    # Pagelist shared by several processes, in a SQLite database in WAL mode.
+    # Each process claims batches of pending titles with a lease, inside a write transaction, so no two
+    # processes get the same titles. Leases are renewed while a process makes progress, and titles whose
+    # lease expired (e.g. the process crashed) are handed out again. The result of every title is recorded.
+    # The page each title resolves to (itself, or the target of a redirect) is recorded as it's processed,
+    # so a page reached through several titles is only processed by one of them.
+    # SQLite locking needs every process to be on the same host, it doesn't work on network filesystems.
+
+    def __init__(self, queue_path: str, lease: float = 600, worker: str = None):
+        os.makedirs(os.path.dirname(os.path.abspath(queue_path)), exist_ok=True)
+        self.queue_path = queue_path
+        self.lease = lease
+        self.worker = worker if worker is not None else f"{socket.gethostname()}:{os.getpid()}"
+        self.last_renewal = time.time()
+        # used by the thread fetching pages and the one editing them
+        self.lock = threading.Lock()
+        # transactions are started explicitly, waiting up to a minute for other processes to release the database
+        self.connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            updated REAL,
+            target TEXT)""")
+        # queues created before targets were recorded
+        if "target" not in [row[1] for row in self.connection.execute("PRAGMA table_info(pages)")]:
+            self.connection.execute("ALTER TABLE pages ADD COLUMN target TEXT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_status ON pages (status, id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_target ON pages (target)")
+
+    def transaction(self, statements):
+        # runs statements(connection) in a write transaction, taking the write lock right away
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.connection)
+                self.connection.execute("COMMIT")
+                return result
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def add(self, pagenames: list[str]) -> int:
+        # adds titles not in the queue yet, compared by their normalized form. returns how many were added
+        def insert(connection):
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO pages (key, title) VALUES (?, ?)",
+                [(normalize_title(pagename), pagename) for pagename in pagenames])
+            return connection.total_changes - before
+        return self.transaction(insert)
+
+    def add_pagelist(self, pagelist_path: str) -> int:
+        if not os.path.exists(pagelist_path):
+            raise Exception(f"Pagelist not found: {pagelist_path}")
+        return sum(self.add(batch) for batch in read_pagelist_batches(pagelist_path))
+
+    def claim(self, count: int) -> list[str]:
+        # hands out up to count titles that are pending, or whose lease expired
+        def claim_titles(connection):
+            now = time.time()
+            rows = connection.execute("""SELECT id, title FROM pages
+                WHERE status = 'pending' OR (status = 'claimed' AND lease_expires < ?)
+                ORDER BY id LIMIT ?""", (now, count)).fetchall()
+            connection.executemany("""UPDATE pages SET status = 'claimed', worker = ?, lease_expires = ?,
+                attempts = attempts + 1, updated = ? WHERE id = ?""",
+                [(self.worker, now + self.lease, now, row_id) for (row_id, _) in rows])
+            return [title for (_, title) in rows]
+        titles = self.transaction(claim_titles)
+        self.last_renewal = time.time()
+        return titles
+
+    def claim_target(self, pagename: str, title: str) -> bool:
+        # records title as the page pagename resolves to. returns False if another title resolving to the same page
+        # is being processed by a process with a valid lease, or was already edited or skipped
+        def record_target(connection):
+            target = normalize_title(title)
+            taken = connection.execute(f"""SELECT COUNT(*) FROM pages WHERE target = ? AND key != ? AND
+                (status IN ({','.join('?' * len(DONE_STATUSES))}) OR (status = 'claimed' AND lease_expires >= ?))""",
+                (target, normalize_title(pagename), *DONE_STATUSES, time.time())).fetchone()[0]
+            if taken:
+                return False
+            connection.execute("UPDATE pages SET target = ? WHERE key = ? AND worker = ?",
+                (target, normalize_title(pagename), self.worker))
+            return True
+        return self.transaction(record_target)
+
+    def complete(self, pagename: str, status: str, message: str = None) -> bool:
+        # records the result of a title. returns False if its lease had expired and it was claimed by another process
+        def record(connection):
+            now = time.time()
+            updated = connection.execute("""UPDATE pages SET status = ?, message = ?, lease_expires = NULL, updated = ?
+                WHERE key = ? AND worker = ? AND status = 'claimed'""",
+                (status, message, now, normalize_title(pagename), self.worker)).rowcount
+            # renewing the lease of titles still to be processed, at most a few times per lease
+            if now - self.last_renewal > self.lease / 10:
+                connection.execute("UPDATE pages SET lease_expires = ? WHERE worker = ? AND status = 'claimed'",
+                    (now + self.lease, self.worker))
+                self.last_renewal = now
+            return updated == 1
+        return self.transaction(record)
+
+    def release(self) -> int:
+        # returns titles claimed but not processed to the queue, e.g. when the run is interrupted
+        def release_titles(connection):
+            return connection.execute("""UPDATE pages SET status = 'pending', worker = NULL, lease_expires = NULL
+                WHERE worker = ? AND status = 'claimed'""", (self.worker,)).rowcount
+        return self.transaction(release_titles)
+
+    def retry_errors(self) -> int:
+        def requeue(connection):
+            return connection.execute("UPDATE pages SET status = 'pending', worker = NULL WHERE status = 'error'").rowcount
+        return self.transaction(requeue)
+
+    def counts(self) -> dict:
+        # number of titles with each status. claimed titles whose lease expired are counted as pending
+        with self.lock:
+            counts = dict(self.connection.execute("""SELECT CASE WHEN status = 'claimed' AND lease_expires < ?
+                THEN 'pending' ELSE status END AS current_status, COUNT(*) FROM pages GROUP BY current_status""",
+                (time.time(),)).fetchall())
+        return counts
+
+    def errors(self) -> list[tuple[str, str]]:
+        with self.lock:
+            return self.connection.execute("SELECT title, message FROM pages WHERE status = 'error' ORDER BY id").fetchall()
+
+    def export(self, pagelist_path: str) -> int:
+        # saves titles not done yet (pending, claimed or with errors) to a pagelist
+        with self.lock:
+            rows = self.connection.execute(f"""SELECT title FROM pages WHERE status NOT IN
+                ({','.join('?' * len(DONE_STATUSES))}) ORDER BY id""", DONE_STATUSES)
+            os.makedirs(os.path.dirname(os.path.abspath(pagelist_path)), exist_ok=True)
+            page_count = 0
+            with open(pagelist_path, "w") as pagelist_file:
+                for (title,) in rows:
+                    pagelist_file.write("{}\n".format(title))
+                    page_count += 1
+        return page_count
+
+    def close(self):
+        self.connection.close()
+
+def format_counts(counts: dict) -> str:
+    statuses = ["pending", "claimed"] + list(DONE_STATUSES) + ["error"]
+    statuses += [status for status in counts if status not in statuses]
+    return "  ".join(f"{status.capitalize()}: {counts.get(status, 0)}" for status in statuses)
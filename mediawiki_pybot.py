@@ -3,19 +3,43 @@ import argparse
 import os
 import sys
 # custom modules
+from lib import daemon
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_PATHS = {
+    'credentials': DIR_PATH + "/cache/credentials.json",
+    'pagelist': DIR_PATH + "/cache/pagelist.txt",
+    'revisions': DIR_PATH + "/cache/revisions.sqlite",
+    'queue': DIR_PATH + "/cache/queue.sqlite",
+    'socket': DIR_PATH + "/cache/daemon.sock",
+    'profiles': DIR_PATH + "/cache/profiles"
+}
+
+# jobs are sent to 'mediawiki_pybot serve' when it's running, before anything else is imported
+if daemon.is_job(sys.argv[1:]) and daemon.send_job(DEFAULT_PATHS['socket'], sys.argv[1:]):
+    sys.exit()
+
+# custom modules
+from lib import dump
+from lib import fanout
 from lib import libmediawiki
+from lib import pagelists
 from lib import utils
+from lib import workqueue
 
 parser = argparse.ArgumentParser(
     prog='mediawiki_pybot',
     description='Command-line utility for performing mass edits on wikis using the MediaWiki API. Made with Python.')
 
-subparsers = parser.add_subparsers(metavar='operation', help="allowed values: {save, pagelist, edit, create}", dest='operation')
+subparsers = parser.add_subparsers(metavar='operation', help="allowed values: {save, pagelist, edit, create, dump, combine, queue, serve}", dest='operation')
 
 parser_save = subparsers.add_parser('save', help="stores login credentials locally. for options see 'mediawiki_pybot save --help'.")
 parser_save.add_argument('-u', '--username', action='store', help="bot account username")
 parser_save.add_argument('-p', '--password', action='store', help="bot password (obtain credentials via Special:BotPasswords)")
 parser_save.add_argument('--url', action='store', help="mediawiki api endpoint url")
+parser_save.add_argument('--profile', action='store',
+    help="save credentials under a name, to be used with --profile or --profiles by other operations. " +
+    "each profile has its own session, pagelist and page cache")
 
 parser_pagelist = subparsers.add_parser('pagelist',
 help="generates list of pages to be edited. for options see 'mediawiki_pybot pagelist --help'.")
@@ -49,6 +73,21 @@ parser_pagelist.add_argument('-l','--limit', action='store',
     help="max number of pages to be returned", type=int)
 parser_pagelist.add_argument('-n','--namespace', action='store',
     help="only return pages in certain namespaces. Use comma separated numbers: \"0,1,2,3\"")
+parser_pagelist.add_argument('--resume', action='store_true',
+    help="continue an interrupted pagelist generation with the same parameters from its last saved batch")
+parser_pagelist.add_argument('-r', '--recursive', action='store_true',
+    help="for category, linkshere and transcludedin sources: also get pages from subcategories, " +
+    "pages linking to the pages found, or pages transcluding the pages found")
+parser_pagelist.add_argument('--depth', action='store',
+    help="max depth of recursion. 0 only gets pages directly related to the target (default: no limit)", type=int)
+parser_pagelist.add_argument('--workers', action='store', default=4,
+    help="number of simultaneous requests when generating a recursive pagelist (default: 4)", type=int)
+parser_pagelist.add_argument('--profile', action='store', help="use the credentials, pagelist and cache of a profile saved with 'save --profile'")
+parser_pagelist.add_argument('--profiles', action='store', nargs='+',
+    help="run on several wikis at once, one process per profile, followed by a combined summary. 'all' for every saved profile. " +
+    "paths given with --save-path get the profile name before the extension")
+parser_pagelist.add_argument('--parallel', action='store',
+    help="with --profiles: max number of wikis at a time (default: all)", type=int)
 
 
 parser_edit = subparsers.add_parser('edit',
@@ -61,62 +100,288 @@ parser_edit.add_argument('--summary', action='store', help="edit summary")
 parser_edit.add_argument('--pagelist-path', action='store', help="loads a pagelist file from a custom location")
 parser_edit.add_argument('--skip-if', action='store', help="pages that contain given string or regex won't be edited")
 parser_edit.add_argument('--skip-ifnot', action='store', help="pages that doesn't contain given string or regex won't be edited")
-parser_edit.add_argument('-d', '--delay', action='store', help="delay between each edit, in seconds", type=int)
+parser_edit.add_argument('--search-prefilter', action='store_true',
+    help="only download pages the wiki's search finds --skip-ifnot in, using an insource: search. needs CirrusSearch. " +
+    "pages are still checked before being edited")
+parser_edit.add_argument('-d', '--delay', action='store',
+    help="minimum delay between each edit, in seconds. ignored if --max-rate is set", type=int)
+parser_edit.add_argument('--cache', action='store_true',
+    help="keep page content in a local cache, only downloading pages that changed since they were cached")
+parser_edit.add_argument('--cache-size', action='store', default=1024,
+    help="max size of the local page cache, in megabytes (default: 1024)", type=int)
+parser_edit.add_argument('--resume', action='store_true',
+    help="skip pages already completed by a previous run that was stopped before updating the pagelist")
+parser_edit.add_argument('--max-rate', action='store',
+    help="max number of edits per minute. edits are slowed down automatically when the wiki is lagged or rate limited", type=float)
+parser_edit.add_argument('--maxlag', action='store',
+    help="max replication lag in seconds before requests are paused (default: 5)", type=int)
+parser_edit.add_argument('--prefetch', action='store',
+    help="number of pages to fetch in the background ahead of the page being edited", type=int)
+edit_source_choices = ['category','fileusage','images','links','linkshere','redirects',
+                       'specialpage','templates','transcludedin','search']
+parser_edit.add_argument('--source', action='store', choices=edit_source_choices, metavar='SOURCE', type=str.lower,
+    help="edit pages straight from a pagelist source instead of a pagelist file, listing pages and fetching their content " +
+    "in the same requests. pages with errors are added to the pagelist. " +
+    "allowed values: {category, fileusage, images, links, linkshere, redirects, specialpage, templates, transcludedin, search}")
+parser_edit.add_argument('-t', '--target', action='store',
+    help="argument for --source (page name, category name, etc.)")
+parser_edit.add_argument('-n', '--namespace', action='store',
+    help="with --source: only edit pages in certain namespaces. Use comma separated numbers: \"0,1,2,3\"")
+parser_edit.add_argument('-l', '--limit', action='store',
+    help="with --source: max number of pages to be edited", type=int)
+parser_edit.add_argument('--conflict-retries', action='store', default=3,
+    help="times a page changed by someone else after it was fetched is fetched again and edited, " +
+    "rechecking the skip filters, before it's saved as an error (default: 3)", type=int)
+parser_edit.add_argument('--rule-profile', action='store_true',
+    help="measure the time and number of matches of each substitution and of --skip-if/--skip-ifnot, " +
+    "showing the slowest rules and the page each was slowest on at the end. included in --report and --prometheus")
+parser_edit.add_argument('--page-timeout', action='store',
+    help="max seconds spent on the skip filters and substitutions of each page. pages over it are saved as errors " +
+    "instead of stalling the run, e.g. on a regex with catastrophic backtracking", type=float)
+parser_edit.add_argument('--report', action='store',
+    help="save a JSON report with timings of each phase, requests, bytes transferred and API errors to the given path")
+parser_edit.add_argument('--prometheus', action='store',
+    help="save the same metrics in Prometheus text format to the given path, for the node_exporter textfile collector")
+parser_edit.add_argument('--queue', action='store_true',
+    help="claim pages from a queue shared with other mediawiki_pybot processes instead of the pagelist, " +
+    "so several processes can edit the same pages without editing any of them twice. fill the queue with 'mediawiki_pybot queue --add'")
+parser_edit.add_argument('--queue-path', action='store', help="with --queue: loads the queue from a custom location")
+parser_edit.add_argument('--lease', action='store', default=600,
+    help="with --queue: seconds a process can hold pages it claimed without making progress, " +
+    "before they're handed to another process (default: 600)", type=float)
+parser_edit.add_argument('--profile', action='store', help="use the credentials, pagelist and cache of a profile saved with 'save --profile'")
+parser_edit.add_argument('--profiles', action='store', nargs='+',
+    help="run on several wikis at once, one process per profile, followed by a combined summary. 'all' for every saved profile. " +
+    "paths given with --pagelist-path, --queue-path and --prometheus get the profile name before the extension")
+parser_edit.add_argument('--parallel', action='store',
+    help="with --profiles: max number of wikis at a time (default: all)", type=int)
 
 parser_create = subparsers.add_parser('create', help="mass create pages. for options see 'mediawiki_pybot create --help'.")
-parser_create.add_argument('-c', '--content', action='store', help="content to be added to each page", required=True)
+parser_create.add_argument('-c', '--content', action='store',
+    help="content to be added to each page. with --data, a template where $field or ${field} is replaced " +
+    "with the field of the row being created ($$ for a literal $)")
+parser_create.add_argument('--content-file', action='store', help="read the content or template from a text file instead of --content")
+parser_create.add_argument('--data', action='store',
+    help="path to a CSV, TSV or JSON Lines file with one page per row, used instead of the pagelist. " +
+    "rows are read as pages are created, so files of any size can be used. pages with errors are added to the pagelist")
+parser_create.add_argument('--title-column', action='store', default="title",
+    help="column or field of --data with the title of each page (default: title)")
+parser_create.add_argument('--data-format', action='store', choices=['csv', 'tsv', 'jsonl'],
+    help="format of --data. detected from the file extension if not set")
 parser_create.add_argument('-p', '--pagelist-path', action='store', help="loads a pagelist file from a custom location")
 parser_create.add_argument('-s', '--summary', action='store', help="edit summary")
-parser_create.add_argument('-d', '--delay', action='store', help="delay between each edit, in seconds", type=int)
+parser_create.add_argument('-d', '--delay', action='store',
+    help="minimum delay between each edit, in seconds. ignored if --max-rate is set", type=int)
+parser_create.add_argument('--resume', action='store_true',
+    help="skip pages already completed by a previous run that was stopped before updating the pagelist")
+parser_create.add_argument('--max-rate', action='store',
+    help="max number of edits per minute. edits are slowed down automatically when the wiki is lagged or rate limited", type=float)
+parser_create.add_argument('--maxlag', action='store',
+    help="max replication lag in seconds before requests are paused (default: 5)", type=int)
+parser_create.add_argument('--workers', action='store', default=1,
+    help="number of pages sent at the same time (default: 1). --max-rate and --delay apply to all of them together", type=int)
+parser_create.add_argument('--report', action='store',
+    help="save a JSON report with timings of each phase, requests, bytes transferred and API errors to the given path")
+parser_create.add_argument('--prometheus', action='store',
+    help="save the same metrics in Prometheus text format to the given path, for the node_exporter textfile collector")
+parser_create.add_argument('--profile', action='store', help="use the credentials, pagelist and cache of a profile saved with 'save --profile'")
+parser_create.add_argument('--profiles', action='store', nargs='+',
+    help="run on several wikis at once, one process per profile, followed by a combined summary. 'all' for every saved profile. " +
+    "paths given with --pagelist-path and --prometheus get the profile name before the extension")
+parser_create.add_argument('--parallel', action='store',
+    help="with --profiles: max number of wikis at a time (default: all)", type=int)
 
-args = parser.parse_args(args=None if sys.argv[1:] else ['--help'])
+parser_dump = subparsers.add_parser('dump',
+    help="generates a pagelist of pages from a XML dump that would be changed by an edit. for options see 'mediawiki_pybot dump --help'.")
+parser_dump.add_argument('-i', '--input', action='store', required=True,
+    help="path to a MediaWiki XML dump. bz2 and gzip compressed dumps are supported")
+parser_dump.add_argument('-s', '--substitution', action='store',
+    help="path to a text file containing a list of text/regex substitutions to be applied when editing pages. See substitution_example.txt for usage.")
+parser_dump.add_argument('-a', '--append', action='store', help="string to be appended to pages when editing")
+parser_dump.add_argument('-p', '--prepend', action='store', help="string to be prepended to pages when editing")
+parser_dump.add_argument('--skip-if', action='store', help="pages that contain given string or regex won't be added")
+parser_dump.add_argument('--skip-ifnot', action='store', help="pages that doesn't contain given string or regex won't be added")
+parser_dump.add_argument('--clear', action='store_true',
+    help="if set, pagelist will be overwritten instead of incremented")
+parser_dump.add_argument('--save-path', action='store',
+    help="save pagelist to a text file in a custom location")
+parser_dump.add_argument('-l','--limit', action='store',
+    help="max number of pages to be returned", type=int)
+parser_dump.add_argument('-n','--namespace', action='store',
+    help="only return pages in certain namespaces. Use comma separated numbers: \"0,1,2,3\"")
 
-if len(sys.argv)==2:
-    #print subparser help when args are insufficient
-    if args.operation == "save":
-        parser_save.print_help()
-    elif args.operation == "pagelist":
-        parser_pagelist.print_help()
-    elif args.operation == "edit":
-        parser_edit.print_help()
-    else:
-        parser.print_help()
-else:
-    DIR_PATH = os.path.dirname(os.path.realpath(__file__))
-    DEFAULT_PATHS = {
-        'credentials': DIR_PATH + "/cache/credentials.json",
-        'pagelist': DIR_PATH + "/cache/pagelist.txt"
-    }
+parser_combine = subparsers.add_parser('combine',
+    help="removes duplicates from pagelists or combines them. for options see 'mediawiki_pybot combine --help'.")
+combine_choices = ['dedup', 'union', 'intersection', 'difference']
+parser_combine.add_argument('-m', '--mode', action='store', choices=combine_choices, metavar='MODE', required=True, type=str.lower,
+    help="allowed values: {dedup, union, intersection, difference} " +
+    "dedup: Remove repeated pages, keeping the first occurrence. " +
+    "union: Pages present in any of the pagelists. " +
+    "intersection: Pages of the first pagelist present in all other pagelists. " +
+    "difference: Pages of the first pagelist not present in any other pagelist. " +
+    "Pagenames are compared ignoring underscores and the case of the first letter.")
+parser_combine.add_argument('-i', '--input', action='store', nargs='+',
+    help="paths of the pagelists to be combined. defaults to the pagelist in the cache folder")
+parser_combine.add_argument('--save-path', action='store',
+    help="save resulting pagelist to a text file in a custom location. defaults to the first pagelist")
+
+parser_queue = subparsers.add_parser('queue',
+    help="fills and inspects the queue used by 'edit --queue'. for options see 'mediawiki_pybot queue --help'.",
+    description="Without options, shows how many pages of the queue are pending, claimed by a running process, " +
+    "edited, skipped or with errors.")
+parser_queue.add_argument('--add', action='store', nargs='?', const="", metavar='PAGELIST',
+    help="add the pages of a pagelist to the queue, leaving out pages already in it. defaults to the pagelist in the cache folder")
+parser_queue.add_argument('--retry-errors', action='store_true', help="hand out pages with errors again")
+parser_queue.add_argument('--errors', action='store_true', help="list pages with errors and their error")
+parser_queue.add_argument('--export', action='store', metavar='PATH',
+    help="save pages not edited or skipped yet to a pagelist")
+parser_queue.add_argument('--queue-path', action='store', help="loads the queue from a custom location")
+parser_queue.add_argument('--profile', action='store', help="use the queue of a profile saved with 'save --profile'")
+
+parser_serve = subparsers.add_parser('serve',
+    help="keeps a logged in session and runs pagelist, edit and create jobs sent by other mediawiki_pybot commands, " +
+    "one at a time. for options see 'mediawiki_pybot serve --help'.",
+    description="While serve is running, pagelist, edit and create commands are sent to it through the Unix socket " +
+    "cache/daemon.sock instead of running on their own, skipping startup and login. Their output is shown as they run. " +
+    "Stopping a command with Ctrl+C stops its job. Commands with --profiles always run on their own. " +
+    "Stop serve with Ctrl+C.")
+
+def run_operation(args: argparse.Namespace) -> bool:
+    # returns False if the operation failed
+    if args.operation == "edit":
+        if args.source is not None and args.target is None:
+            parser_edit.error("--target is required when --source is set")
+        if args.search_prefilter and args.skip_ifnot is None:
+            parser_edit.error("--skip-ifnot is required when --search-prefilter is set")
+        if (args.queue or args.queue_path is not None) and args.source is not None:
+            parser_edit.error("--queue can't be used with --source")
+        if args.page_timeout is not None and args.page_timeout <= 0:
+            parser_edit.error("--page-timeout must be greater than 0")
+    elif args.operation == "create":
+        if (args.content is None) == (args.content_file is None):
+            parser_create.error("one of --content or --content-file is required")
     try:
+        if args.operation == "create" and args.content_file is not None:
+            with open(args.content_file) as content_file:
+                args.content = content_file.read()
+            args.content_file = None
+        if getattr(args, 'profiles', None) is not None:
+            fanout.run_fanout(run_operation, args, DEFAULT_PATHS['profiles'])
+            return True
+        PATHS = DEFAULT_PATHS
+        if getattr(args, 'profile', None) is not None:
+            PATHS = fanout.get_profile_paths(DEFAULT_PATHS['profiles'], args.profile)
         #performing actions based on args
         if args.operation == "save":
-            utils.save_credentials(DEFAULT_PATHS['credentials'], username=args.username, password=args.password, url=args.url)
+            utils.save_credentials(PATHS['credentials'], username=args.username, password=args.password, url=args.url)
             print("Credentials saved successfully.")
         elif args.operation == "pagelist":
-            PAGELIST_PATH = args.save_path if args.save_path is not None else DEFAULT_PATHS['pagelist']
+            PAGELIST_PATH = args.save_path if args.save_path is not None else PATHS['pagelist']
             PAGELIST_MODE = "w" if args.clear else "a"
-            URL = libmediawiki.get_url(DEFAULT_PATHS['credentials'])
-            pagelist = libmediawiki.generate_pagelist(url=URL, pagelist_source=args.source, pagelist_target=args.target,
-            namespace=args.namespace, limit=args.limit)
-            if len(pagelist) == 0:
+            URL = libmediawiki.get_url(PATHS['credentials'])
+            page_count = libmediawiki.save_pagelist(url=URL, pagelist_path=PAGELIST_PATH, pagelist_mode=PAGELIST_MODE,
+            pagelist_source=args.source, pagelist_target=args.target, namespace=args.namespace, limit=args.limit,
+            resume=args.resume, recursive=args.recursive, depth=args.depth, workers=args.workers)
+            if page_count == 0:
                 print("No pages found with given parameters.")
             else:
-                utils.write_pagelist(pagelist, PAGELIST_PATH, PAGELIST_MODE)
-                print(f"{args.source.capitalize()}:{args.target} - {len(pagelist)} pages added to pagelist.")
+                print(f"{args.source.capitalize()}:{args.target} - {page_count} pages added to pagelist.")
         elif args.operation == "edit":
-            CSRF_TOKEN = libmediawiki.get_token(DEFAULT_PATHS['credentials'])
-            URL = libmediawiki.get_url(DEFAULT_PATHS['credentials'])
-            PAGELIST_PATH = args.pagelist_path if args.pagelist_path is not None else DEFAULT_PATHS['pagelist']
+            CSRF_TOKEN = libmediawiki.get_token(PATHS['credentials'])
+            URL = libmediawiki.get_url(PATHS['credentials'])
+            PAGELIST_PATH = args.pagelist_path if args.pagelist_path is not None else PATHS['pagelist']
+            QUEUE_PATH = args.queue_path if args.queue_path is not None else PATHS['queue'] if args.queue else None
             libmediawiki.edit_pages(csrf_token=CSRF_TOKEN, url=URL, pagelist_path=PAGELIST_PATH, summary=args.summary,
             substitution_path=args.substitution, append=args.append,
-            prepend=args.prepend, skip_if=args.skip_if, skip_ifnot=args.skip_ifnot, delay=args.delay)
+            prepend=args.prepend, skip_if=args.skip_if, skip_ifnot=args.skip_ifnot, delay=args.delay,
+            prefetch=args.prefetch, max_rate=args.max_rate, maxlag=args.maxlag,
+            cache_path=PATHS['revisions'] if args.cache else None, cache_size=args.cache_size, resume=args.resume,
+            pagelist_source=args.source, pagelist_target=args.target, namespace=args.namespace, limit=args.limit,
+            report_path=args.report, prometheus_path=args.prometheus, search_prefilter=args.search_prefilter,
+            queue_path=QUEUE_PATH, lease=args.lease, rule_profile=args.rule_profile, page_timeout=args.page_timeout,
+            conflict_retries=args.conflict_retries)
         elif args.operation == "create":
-            CSRF_TOKEN = libmediawiki.get_token(DEFAULT_PATHS['credentials'])
-            URL = libmediawiki.get_url(DEFAULT_PATHS['credentials'])
-            PAGELIST_PATH = args.pagelist_path if args.pagelist_path is not None else DEFAULT_PATHS['pagelist']
+            CSRF_TOKEN = libmediawiki.get_token(PATHS['credentials'])
+            URL = libmediawiki.get_url(PATHS['credentials'])
+            PAGELIST_PATH = args.pagelist_path if args.pagelist_path is not None else PATHS['pagelist']
             libmediawiki.create_pages(csrf_token=CSRF_TOKEN, url=URL, content=args.content, pagelist_path=PAGELIST_PATH,
-            summary=args.summary, delay=args.delay)
+            summary=args.summary, delay=args.delay, max_rate=args.max_rate, maxlag=args.maxlag, resume=args.resume,
+            report_path=args.report, prometheus_path=args.prometheus, workers=args.workers,
+            data_path=args.data, title_column=args.title_column, data_format=args.data_format)
+        elif args.operation == "dump":
+            PAGELIST_PATH = args.save_path if args.save_path is not None else PATHS['pagelist']
+            PAGELIST_MODE = "w" if args.clear else "a"
+            page_count = dump.scan_dump(dump_path=args.input, pagelist_path=PAGELIST_PATH, pagelist_mode=PAGELIST_MODE,
+            substitution_path=args.substitution, append=args.append, prepend=args.prepend, skip_if=args.skip_if,
+            skip_ifnot=args.skip_ifnot, namespace=args.namespace, limit=args.limit)
+            if page_count == 0:
+                print("No pages found with given parameters.")
+            else:
+                print(f"Dump:{os.path.basename(args.input)} - {page_count} pages added to pagelist.")
+        elif args.operation == "combine":
+            INPUT_PATHS = args.input if args.input is not None else [PATHS['pagelist']]
+            PAGELIST_PATH = args.save_path if args.save_path is not None else INPUT_PATHS[0]
+            page_count = pagelists.combine_pagelists(args.mode, INPUT_PATHS, PAGELIST_PATH)
+            print(f"{args.mode.capitalize()} - {page_count} pages saved to {PAGELIST_PATH}.")
+        elif args.operation == "queue":
+            QUEUE_PATH = args.queue_path if args.queue_path is not None else PATHS['queue']
+            work_queue = workqueue.WorkQueue(QUEUE_PATH)
+            if args.add is not None:
+                PAGELIST_PATH = args.add if args.add != "" else PATHS['pagelist']
+                page_count = work_queue.add_pagelist(PAGELIST_PATH)
+                print(f"{page_count} pages added to the queue.")
+            if args.retry_errors:
+                print(f"{work_queue.retry_errors()} pages with errors will be handed out again.")
+            if args.errors:
+                for (pagename, error) in work_queue.errors():
+                    print(f"{pagename}:  Error: {error}")
+            if args.export is not None:
+                page_count = work_queue.export(args.export)
+                print(f"{page_count} pages not done yet saved to {args.export}.")
+            print(f"Queue: {QUEUE_PATH}  {workqueue.format_counts(work_queue.counts())}")
+            work_queue.close()
     except Exception as e:
         print(e)
-        
+        return False
+    return True
+
+def run_job(argv: list[str]):
+    # runs a job sent to the daemon, with the same arguments as a command
+    args = parser.parse_args(argv)
+    if getattr(args, 'profiles', None) is not None:
+        print("--profiles can't be used in jobs sent to the daemon.")
+        return
+    # the job runs as if it was the only one, with default settings for everything it doesn't set
+    libmediawiki.reset_run_settings()
+    run_operation(args)
+
+args = parser.parse_args(args=None if sys.argv[1:] else ['--help'])
+
+if len(sys.argv)==2 and args.operation not in ("serve", "queue"):
+    #print subparser help when args are insufficient
+    if args.operation == "save":
+        parser_save.print_help()
+    elif args.operation == "pagelist":
+        parser_pagelist.print_help()
+    elif args.operation == "edit":
+        parser_edit.print_help()
+    elif args.operation == "dump":
+        parser_dump.print_help()
+    elif args.operation == "combine":
+        parser_combine.print_help()
+    else:
+        parser.print_help()
+elif args.operation == "serve":
+    try:
+        # logging in before the first job, the session is then shared by every job
+        libmediawiki.get_token(DEFAULT_PATHS['credentials'])
+    except Exception as e:
+        print(e)
+    try:
+        daemon.JobServer(DEFAULT_PATHS['socket'], run_job).serve_forever()
+    except Exception as e:
+        print(e)
+else:
+    run_operation(args)
+
 parser.exit()
\ No newline at end of file